@@ -0,0 +1,69 @@
+import argparse
+import time
+from pathlib import Path
+
+from pyradar.utils import DistReader
+
+DIST_PATTERNS = ["*.tar.gz", "*.zip", "*.whl", "*.egg"]
+
+
+def list_dists(paths: list[str]) -> list[str]:
+    dists = []
+    for path in paths:
+        if Path(path).is_dir():
+            for pattern in DIST_PATTERNS:
+                dists.extend(str(p) for p in sorted(Path(path).rglob(pattern)))
+        else:
+            dists.append(path)
+    return dists
+
+
+def time_file_shas(path: str, repeat: int, **options) -> tuple[float, list]:
+    """the best time (in seconds) of `repeat` runs of `DistReader.file_shas` and its result"""
+    best, res = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = DistReader(path, **options).file_shas()
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="compare the original readers of distributions (random-access tar reads, serial zip reads) "
+        "with the streaming tar reader and the thread-parallel zip reader"
+    )
+    # distribution files, or folders searched for distribution files, e.g., $DATA_HOME/distribution
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    # the number of threads hashing the members of zip archives
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--translate_newline", default=True, action=argparse.BooleanOptionalAction
+    )
+    args = parser.parse_args()
+
+    total = {"original": 0.0, "fast": 0.0}
+    for path in list_dists(args.paths):
+        original, original_res = time_file_shas(
+            path,
+            args.repeat,
+            translate_newline=args.translate_newline,
+            streaming=False,
+            threads=1,
+        )
+        fast, fast_res = time_file_shas(
+            path,
+            args.repeat,
+            translate_newline=args.translate_newline,
+            streaming=True,
+            threads=args.threads,
+        )
+        if original_res != fast_res:
+            print(f"{path}: the readers disagree")
+        total["original"] += original
+        total["fast"] += fast
+        print(
+            f"{path}: {len(fast_res)} files, original {original:.3f}s, fast {fast:.3f}s, {original / max(fast, 1e-9):.1f}x"
+        )
+    print(f"total: original {total['original']:.3f}s, fast {total['fast']:.3f}s")
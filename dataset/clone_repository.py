@@ -14,9 +14,14 @@ def chunks(lst: list[str], n: int):
         yield lst[i : i + n]
 
 
-def main(urls: list[str], base_folder: str):
+def main(
+    urls: list[str],
+    base_folder: str,
+    share_forks: bool = False,
+    blobless: bool = True,
+):
     for url in urls:
-        Repository(url, base_folder)
+        Repository(url, base_folder, share_forks=share_forks, blobless=blobless)
 
 
 if __name__ == "__main__":
@@ -24,6 +29,15 @@ if __name__ == "__main__":
     parser.add_argument("--processes", type=int, default=1)
     parser.add_argument("--chunk_size", type=int, default=1)
     parser.add_argument("--base_folder", type=str, required=True)
+    # forks share the objects of the first cloned member of their family through git alternates
+    parser.add_argument(
+        "--share_forks", default=False, action=argparse.BooleanOptionalAction
+    )
+    # blob-set features only need commits and trees, use --no-blobless to clone blobs as well,
+    # e.g., for the near matches of `run_validator --near_match`
+    parser.add_argument(
+        "--blobless", default=True, action=argparse.BooleanOptionalAction
+    )
     args = parser.parse_args()
 
     df = pd.read_csv(
@@ -47,7 +61,8 @@ if __name__ == "__main__":
     chunk_lst = chunks(remaining, chunk_size)
 
     Parallel(n_jobs=processes, backend="multiprocessing")(
-        delayed(main)(urls, args.base_folder) for urls in chunk_lst
+        delayed(main)(urls, args.base_folder, args.share_forks, args.blobless)
+        for urls in chunk_lst
     )
 
     cloned_urls = []
@@ -6,7 +6,7 @@ from typing import Optional
 
 import pandas as pd
 
-from pyradar.utils import DistReader
+from pyradar.dist_cache import DIST_CACHE_FILE, DistCache
 
 logging.basicConfig(format="%(message)s", level=logging.ERROR)
 
@@ -102,8 +102,17 @@ def list_release_dist_files(
     mirror: Optional[str] = None,
     check: bool = True,
     logger: logging.Logger = None,
+    dist_cache: Optional[DistCache] = None,
 ):
     logger = logger or logging.getLogger(__name__)
+    if dist_cache is None:
+        # the cache lives in `$DATA_HOME`, next to the distribution folder
+        with DistCache(
+            os.path.join(os.path.dirname(dist_folder), DIST_CACHE_FILE)
+        ) as dist_cache:
+            return list_release_dist_files(
+                df, dist_folder, mirror, check, logger, dist_cache
+            )
     df = df.copy()
     if mirror:
         df.loc[:, "url"] = df["url"].apply(
@@ -117,8 +126,9 @@ def list_release_dist_files(
         success = True
         if not success:
             continue
-        reader = DistReader(save_path, translate_newline=True)
-        res[row.filename] = reader.file_shas()
+        res[row.filename] = dist_cache.file_shas(
+            save_path, translate_newline=True, sha256=getattr(row, "sha256", None)
+        )
 
     return res
 
@@ -132,14 +142,16 @@ def chunks(df: pd.DataFrame, chunk_size: int):
 def main(data: pd.DataFrame, i: int, dist_folder: str, mirror: Optional[str] = None):
     # logger = configure_logger("dist_diff-{i}", f"log/dist_diff-{i}.log", logging.ERROR)
 
+    dist_cache = DistCache(os.path.join(os.path.dirname(dist_folder), DIST_CACHE_FILE))
     res = {}
     for name in data["name"].unique():
         try:
             res[name] = list_release_dist_files(
-                data[data["name"] == name], dist_folder, mirror
+                data[data["name"] == name], dist_folder, mirror, dist_cache=dist_cache
             )
         except Exception as e:
             logging.error(f"Error for {name}: {e}")
+    dist_cache.close()
 
     with open(f"data/release_dist_files-{i}.json", "w") as outf:
         json.dump(res, outf)
@@ -99,6 +99,8 @@ def dump_distribution_info(data_path: str, drop: bool = False):
                     data["version"] = version.rsplit(".", 1)[0]
                     for key in ["packagetype", "filename", "upload_time", "url"]:
                         data[key] = info_data.get(key, None)
+                    # the key of the distribution cache, see `pyradar.dist_cache`
+                    data["sha256"] = (info_data.get("digests") or {}).get("sha256")
                     batch.append(data)
                     if len(batch) % 100000 == 0:
                         try:
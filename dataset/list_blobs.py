@@ -2,10 +2,14 @@ import argparse
 import json
 import logging
 import os
+import shutil
 from pathlib import Path
+from typing import Optional
 
 from joblib import Parallel, delayed
 
+from pyradar.blob_index import BlobIndex
+from pyradar.index import RepoIndex
 from pyradar.repository import Repository
 
 logger = logging.getLogger(__name__)
@@ -17,16 +21,51 @@ def chunks(lst: list[str], n: int):
         yield lst[i : i + n]
 
 
-def main(urls: list[str], base_folder: str):
+def main(
+    urls: list[str],
+    base_folder: str,
+    update: bool = False,
+    max_edges: int = 2000000,
+    memory_budget: Optional[int] = None,
+    repo_jobs: int = 1,
+    parallel_threshold: int = 10000,
+    maintain: bool = False,
+    variants: bool = False,
+):
+    # the repositories of the batch are added to the host-wide blob index once they are finished
+    blob_index = BlobIndex(os.path.join(base_folder, "blob_index"))
     for url in urls:
-        repo = Repository(url, base_folder)
-        if len(repo.commit_shas) > 10000:
-            print(f"{url}: {len(repo.commit_shas)} commits")
-        repo.traverse_all()
-        logging.error(f"Finish {url}")
+        repo = Repository(
+            url,
+            base_folder,
+            max_edges=max_edges,
+            memory_budget=memory_budget,
+            n_jobs=repo_jobs,
+            parallel_threshold=parallel_threshold,
+        )
+        if update:
+            # fetch and only traverse commits that are not in the index yet
+            summary = repo.update(maintain=maintain)
+            logging.error(f"Finish updating {url}: {summary}")
+        else:
+            if len(repo.commit_shas) > 10000:
+                print(f"{url}: {len(repo.commit_shas)} commits")
+            summary = repo.traverse_all()
+            logging.error(f"Finish {url}: {summary}")
+        if variants:
+            # the near-match digests of the blobs indexed since the last run
+            repo.blob_variants
+        repo.close()
+        blob_index.add_repo(repo.url, repo.index_folder)
+    blob_index.flush()
 
 
 def clean(base_folder: str):
+    fs = list(Path(f"{base_folder}/repository/").glob("*/*/*/index"))
+    for f in fs:
+        shutil.rmtree(f, ignore_errors=True)
+    shutil.rmtree(f"{base_folder}/blob_index", ignore_errors=True)
+    # indexes written by older versions
     fs = list(Path(f"{base_folder}/repository/").glob("*/*/*/index.json"))
     for f in fs:
         f.unlink(missing_ok=True)
@@ -43,17 +82,48 @@ if __name__ == "__main__":
     parser.add_argument("--chunk_size", type=int, default=1)
     parser.add_argument("--base_folder", type=str, required=True)
     parser.add_argument("--clean", default=False, action=argparse.BooleanOptionalAction)
+    parser.add_argument(
+        "--update", default=False, action=argparse.BooleanOptionalAction
+    )
+    parser.add_argument("--max_edges", type=int, default=2000000)
+    # resident memory limit of each process in MB
+    parser.add_argument("--memory_budget", type=int, default=None)
+    # worker processes for the commits of one repository with at least `parallel_threshold` commits,
+    # pools cannot nest, so use it with `--processes 1` for the batch of very large repositories
+    parser.add_argument("--repo_jobs", type=int, default=1)
+    parser.add_argument("--parallel_threshold", type=int, default=10000)
+    # repack the fetched objects and rewrite the commit-graph when updating
+    parser.add_argument(
+        "--maintain", default=False, action=argparse.BooleanOptionalAction
+    )
+    # compute the LF-normalized shas and whitespace fingerprints of the indexed blobs,
+    # used by `Validator(near_match=True)`, not available for blobless clones
+    parser.add_argument(
+        "--variants", default=False, action=argparse.BooleanOptionalAction
+    )
     args = parser.parse_args()
     processes = args.processes
     chunk_size = args.chunk_size
     do_clean = args.clean
+    do_update = args.update
+
+    if do_clean:
+        clean(args.base_folder)
 
     cloned_urls = json.load(open("data/cloned_repos.json"))
     remaining = []
     for url in cloned_urls:
         forge, user, repo = url.split("/")[-3:]
-        path = f"{args.base_folder}/repository/{forge}/{user}/{repo}/index.json"
-        if not os.path.exists(path):
+        folder = f"{args.base_folder}/repository/{forge}/{user}/{repo}/index"
+        if do_update:
+            # fetch all indexed repositories and extend their indexes
+            selected = RepoIndex.exists(folder)
+        else:
+            # an interrupted or window-only traversal is resumed as well
+            selected = not RepoIndex.exists(folder) or not RepoIndex(folder).covers(
+                None
+            )
+        if selected:
             remaining.append(url)
 
     print(
@@ -63,5 +133,16 @@ if __name__ == "__main__":
     chunk_lst = chunks(remaining, chunk_size)
 
     Parallel(n_jobs=processes, backend="multiprocessing")(
-        delayed(main)(task, args.base_folder) for task in chunk_lst
+        delayed(main)(
+            task,
+            args.base_folder,
+            do_update,
+            args.max_edges,
+            args.memory_budget,
+            args.repo_jobs,
+            args.parallel_threshold,
+            args.maintain,
+            args.variants,
+        )
+        for task in chunk_lst
     )
@@ -0,0 +1,81 @@
+import argparse
+import json
+import logging
+import time
+
+from joblib import Parallel, delayed
+
+from pyradar.maintenance import last_maintenance, maintain
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+
+def chunks(lst: list[str], n: int):
+    for i in range(0, len(lst), n):
+        yield lst[i : i + n]
+
+
+def main(
+    urls: list[str],
+    base_folder: str,
+    full: bool = False,
+    threads: int = 1,
+    timings: bool = True,
+) -> list[dict]:
+    summaries = []
+    for url in urls:
+        summary = maintain(
+            url, base_folder, full=full, threads=threads, timings=timings
+        )
+        if summary is not None:
+            logging.error(f"Finish maintaining {url}: {summary['steps']}")
+            summaries.append(summary)
+    return summaries
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(message)s", level=logging.ERROR)
+
+    parser = argparse.ArgumentParser()
+    # the number of repositories maintained at the same time
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--chunk_size", type=int, default=1)
+    parser.add_argument("--base_folder", type=str, required=True)
+    # the number of threads git may use to repack one repository
+    parser.add_argument("--threads", type=int, default=1)
+    # repack all packs of every repository into one
+    parser.add_argument("--full", default=False, action=argparse.BooleanOptionalAction)
+    # skip repositories maintained within the last `min_interval` hours
+    parser.add_argument("--min_interval", type=float, default=24)
+    # time listing objects and commits before and after the maintenance
+    parser.add_argument(
+        "--timings", default=True, action=argparse.BooleanOptionalAction
+    )
+    args = parser.parse_args()
+
+    cloned_urls = json.load(open("data/cloned_repos.json"))
+    now = time.time()
+    remaining = []
+    for url in cloned_urls:
+        last = last_maintenance(url, args.base_folder)
+        if last is None or now - last["time"] >= args.min_interval * 3600:
+            remaining.append(url)
+
+    print(
+        f"{len(cloned_urls)} repos, {len(remaining)} left, {args.processes} processes, {args.chunk_size} repos per batch"
+    )
+
+    chunk_lst = chunks(remaining, args.chunk_size)
+
+    results = Parallel(n_jobs=args.processes, backend="multiprocessing")(
+        delayed(main)(task, args.base_folder, args.full, args.threads, args.timings)
+        for task in chunk_lst
+    )
+    summaries = [summary for summaries in results for summary in summaries]
+    print(f"{len(summaries)} repos maintained")
+    if args.timings and summaries:
+        for attr in ("object_shas", "commit_shas"):
+            before = sum(summary["before"][attr] for summary in summaries)
+            after = sum(summary["after"][attr] for summary in summaries)
+            print(f"{attr}: {before:.1f}s before, {after:.1f}s after")
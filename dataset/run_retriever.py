@@ -16,6 +16,7 @@ from joblib import Parallel, delayed
 from pymongo import MongoClient
 from tqdm import tqdm
 
+from pyradar.blob_index import BlobIndex
 from pyradar.utils import download
 from pyradar.woc_retriever import WoCRetriever, defork, get_most_common, restore_url
 
@@ -40,9 +41,20 @@ headers = {
 }
 
 
-def get_candidates_main(name: str, version: str, base_folder: str, mirror: str = None):
+def get_candidates_main(
+    name: str,
+    version: str,
+    base_folder: str,
+    mirror: str = None,
+    offline: bool = False,
+):
     try:
-        wr = WoCRetriever(name, version, base_folder, mirror=mirror)
+        blob_index = None
+        if offline:
+            blob_index = BlobIndex(os.path.join(base_folder, "blob_index"))
+        wr = WoCRetriever(
+            name, version, base_folder, mirror=mirror, blob_index=blob_index
+        )
         if wr.fileshas:
             return wr.get_candidates()
     except Exception as e:
@@ -55,10 +67,11 @@ def get_candidates(
     base_folder: str,
     n_jobs: int = 1,
     mirror: Optional[str] = None,
+    offline: bool = False,
 ):
     retriever_dataset = pd.read_csv(data_path, low_memory=False, keep_default_na=False)
     results = Parallel(n_jobs=n_jobs, backend="multiprocessing")(
-        delayed(get_candidates_main)(name, version, base_folder, mirror)
+        delayed(get_candidates_main)(name, version, base_folder, mirror, offline)
         for name, version in tqdm(
             retriever_dataset[["name", "version"]].itertuples(index=False),
             file=sys.stdout,
@@ -281,6 +294,10 @@ if __name__ == "__main__":
     parser.add_argument("--chunk_size", default=400, type=int)
     parser.add_argument("--n_candidate", default=5, type=int)
     parser.add_argument("--thresh", default=0.5, type=float)
+    # look up candidates in the local blob index (see pyradar.blob_index) instead of WoC
+    parser.add_argument(
+        "--offline", default=False, action=argparse.BooleanOptionalAction
+    )
     parser.add_argument(
         "--candidates", default=False, action=argparse.BooleanOptionalAction
     )
@@ -340,6 +357,7 @@ if __name__ == "__main__":
             args.base_folder,
             args.n_jobs,
             args.mirror,
+            offline=args.offline,
         )
 
     if args.most_common:
@@ -367,6 +385,7 @@ if __name__ == "__main__":
             args.base_folder,
             args.n_jobs,
             args.mirror,
+            offline=args.offline,
         )
 
     if args.most_common_remaining:
@@ -402,6 +421,7 @@ if __name__ == "__main__":
             args.base_folder,
             args.n_jobs,
             args.mirror,
+            offline=args.offline,
         )
 
     if args.most_common_dataset_remaining:
@@ -4,6 +4,7 @@ import logging
 import math
 import os
 import sys
+from typing import Optional
 
 import pandas as pd
 from joblib import Parallel, delayed
@@ -20,19 +21,37 @@ def chunks(data, n: int):
         yield data[i : i + n]
 
 
-def get_phantom_file(data: pd.DataFrame, i: int, base_folder: str, prefix: str):
+def get_phantom_file(
+    data: pd.DataFrame,
+    i: int,
+    base_folder: str,
+    prefix: str,
+    grace_days: Optional[int] = None,
+    near_match: bool = False,
+):
     res = {}
     for row in data.itertuples(index=False):
         name = row.name
         version = row.version
         url = row.url
         try:
-            v = Validator(name, version, url, base_folder)
+            v = Validator(
+                name,
+                version,
+                url,
+                base_folder,
+                grace_days=grace_days,
+                near_match=near_match,
+            )
             tmp = {}
             tmp["version"] = version
             tmp["url"] = url
             tmp["phantom_file"] = v.phantom_files
+            if near_match:
+                # the whitespace and CR variants are missing for blobless clones
+                tmp["near_match_complete"] = v.near_match_complete
             res[name] = tmp
+            v.close()
         except Exception as e:
             logger.error(f"{name}, {version}, {url}, {e}")
 
@@ -40,10 +59,26 @@ def get_phantom_file(data: pd.DataFrame, i: int, base_folder: str, prefix: str):
         json.dump(res, outf)
 
 
-def feature_main(name: str, version: str, url: str, base_folder: str):
+def feature_main(
+    name: str,
+    version: str,
+    url: str,
+    base_folder: str,
+    grace_days: Optional[int] = None,
+    near_match: bool = False,
+):
     try:
-        v = Validator(name, version, url, base_folder)
-        return [name, version, url] + v.features()
+        v = Validator(
+            name,
+            version,
+            url,
+            base_folder,
+            grace_days=grace_days,
+            near_match=near_match,
+        )
+        features = v.features()
+        v.close()
+        return [name, version, url] + features
     except:
         logger.error(f"{name}, {version}, {url}")
         return [name, version, url] + [-1] * 6
@@ -58,6 +93,15 @@ if __name__ == "__main__":
     parser.add_argument("--n_jobs", default=1, type=int)
     parser.add_argument("--chunk_size", default=100, type=int)
     parser.add_argument("--mirror", default=None, type=str)
+    # only compare against commits authored up to this many days after the release upload
+    parser.add_argument("--grace_days", default=None, type=int)
+    # files differing only in newlines or whitespace from a repository file are not phantom files.
+    # The variants are computed from the blob contents, so precompute them with `list_blobs --variants`;
+    # blobless clones (the default of `clone_repository`) have no contents, so only files whose
+    # LF-normalized sha is a repository blob are matched there, use `clone_repository --no-blobless`
+    parser.add_argument(
+        "--near_match", default=False, action=argparse.BooleanOptionalAction
+    )
     parser.add_argument(
         "--features", default=False, action=argparse.BooleanOptionalAction
     )
@@ -80,7 +124,14 @@ if __name__ == "__main__":
     if args.phantom_file:
         positive_prefix = "positive_phantom_files"
         Parallel(n_jobs=args.n_jobs, backend="multiprocessing")(
-            delayed(get_phantom_file)(data, i, args.base_folder, positive_prefix)
+            delayed(get_phantom_file)(
+                data,
+                i,
+                args.base_folder,
+                positive_prefix,
+                args.grace_days,
+                args.near_match,
+            )
             for i, data in enumerate(chunks(positive_df, args.chunk_size))
         )
         positive_res = {}
@@ -95,7 +146,14 @@ if __name__ == "__main__":
 
         negative_prefix = "negative_phantom_files"
         Parallel(n_jobs=args.n_jobs, backend="multiprocessing")(
-            delayed(get_phantom_file)(data, i, args.base_folder, negative_prefix)
+            delayed(get_phantom_file)(
+                data,
+                i,
+                args.base_folder,
+                negative_prefix,
+                args.grace_days,
+                args.near_match,
+            )
             for i, data in enumerate(chunks(negative_df, args.chunk_size))
         )
         negative_res = {}
@@ -110,7 +168,9 @@ if __name__ == "__main__":
 
     if args.features:
         positive_data = Parallel(n_jobs=args.n_jobs, backend="multiprocessing")(
-            delayed(feature_main)(name, version, url, args.base_folder)
+            delayed(feature_main)(
+                name, version, url, args.base_folder, args.grace_days, args.near_match
+            )
             for name, version, url in tqdm(
                 positive_df[["name", "version", "url"]].itertuples(index=False),
                 total=len(positive_df),
@@ -133,7 +193,9 @@ if __name__ == "__main__":
         positive_data["label"] = 0
 
         negative_data = Parallel(n_jobs=args.n_jobs, backend="multiprocessing")(
-            delayed(feature_main)(name, version, url, args.base_folder)
+            delayed(feature_main)(
+                name, version, url, args.base_folder, args.grace_days, args.near_match
+            )
             for name, version, url in tqdm(
                 negative_df[["name", "version", "url"]].itertuples(index=False),
                 total=len(negative_df),
@@ -219,7 +281,14 @@ if __name__ == "__main__":
         print(f"{len(latest_releases)} releases")
 
         features = Parallel(n_jobs=args.n_jobs, backend="multiprocessing")(
-            delayed(feature_main)(name, version, repo_url, args.base_folder)
+            delayed(feature_main)(
+                name,
+                version,
+                repo_url,
+                args.base_folder,
+                args.grace_days,
+                args.near_match,
+            )
             for name, version, repo_url in tqdm(
                 latest_releases[["name", "version", "redirected"]].itertuples(
                     index=False
@@ -0,0 +1,247 @@
+import fcntl
+import json
+import logging
+import os
+from contextlib import contextmanager
+from functools import cached_property
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from pyradar.index import BLOB_DTYPE, RepoIndex, hex_to_bin, load_array
+
+logger = logging.getLogger(__name__)
+
+REPO_DTYPE = np.dtype("<u4")
+
+
+class BlobIndex:
+    def __init__(self, folder: str, merge_factor: int = 8) -> None:
+        """A host-wide inverted index from blob shas to the local repositories containing them.
+
+        The index is built from the per-repository indexes (see `RepoIndex`) and is a folder of
+        immutable segments, each a pair of raw arrays sorted by blob sha:
+
+        - `segment-<n>-blobs.bin`: 20-byte blob shas
+        - `segment-<n>-repos.bin`: the id of a repository containing the blob
+        - `meta.json`: the live segments and the indexed repositories, i.e., (url, number of blobs,
+          `RepoIndex.generation`) records where the repository id is the position in the list
+
+        Adding repositories writes a new segment with the blobs not indexed yet (blob ids of a
+        `RepoIndex` are append-only, so only the tail of its blob array is new, unless its generation
+        changed, i.e., it was rebuilt). Segments of similar size form a tier, i.e., the same power of
+        `merge_factor`, and the segments of a tier are merged into one of the next tier once there are
+        `merge_factor` of them, so each blob is rewritten a logarithmic number of times. All segments are only merged into one by `compact`. Writers
+        serialize on a lock file, so worker processes can add the repositories they finish concurrently.
+
+        Args:
+            folder (str): the index folder, e.g., `$DATA_HOME/blob_index`
+            merge_factor (int, optional): the number of segments of a tier that are merged. Defaults to 8.
+        """
+        self.folder = folder
+        self.merge_factor = merge_factor
+        # (url, RepoIndex folder) pairs waiting for the next `flush`
+        self.pending: list[tuple[str, str]] = []
+
+    @staticmethod
+    def exists(folder: str) -> bool:
+        return os.path.exists(os.path.join(folder, "meta.json"))
+
+    @cached_property
+    def meta(self) -> dict:
+        return self._read_meta()
+
+    def _read_meta(self) -> dict:
+        if not BlobIndex.exists(self.folder):
+            return {"next_segment": 0, "segments": [], "repos": []}
+        with open(os.path.join(self.folder, "meta.json")) as f:
+            return json.load(f)
+
+    def _write_meta(self, meta: dict):
+        tmp_path = os.path.join(self.folder, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.folder, "meta.json"))
+        self.__dict__.pop("meta", None)
+        self.__dict__.pop("segments", None)
+        self.__dict__.pop("urls", None)
+
+    @contextmanager
+    def _lock(self):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, "lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _segment_path(self, segment: int, name: str) -> str:
+        return os.path.join(self.folder, f"segment-{segment}-{name}.bin")
+
+    @cached_property
+    def segments(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        """the memory-mapped (sorted blob shas, repository ids) arrays of the live segments"""
+        return [
+            (
+                load_array(self._segment_path(segment, "blobs"), BLOB_DTYPE),
+                load_array(self._segment_path(segment, "repos"), REPO_DTYPE),
+            )
+            for segment in self.meta["segments"]
+        ]
+
+    @cached_property
+    def urls(self) -> list[str]:
+        """repository urls indexed by repository id"""
+        return [repo[0] for repo in self.meta["repos"]]
+
+    def __len__(self) -> int:
+        return sum(len(blobs) for blobs, _ in self.segments)
+
+    def lookup(self, blob_shas: Iterable[str]) -> list[list[str]]:
+        """the urls of the local repositories containing each blob
+
+        Args:
+            blob_shas (Iterable[str]): hex blob shas
+
+        Returns:
+            list[list[str]]: the repository urls of each blob, empty if no repository contains it
+        """
+        query = hex_to_bin(blob_shas)
+        res = [{} for _ in range(len(query))]
+        for blobs, repos in self.segments:
+            if len(blobs) == 0:
+                continue
+            starts = np.searchsorted(blobs, query, side="left")
+            ends = np.searchsorted(blobs, query, side="right")
+            for i in np.flatnonzero(ends > starts).tolist():
+                for repo_id in repos[starts[i] : ends[i]].tolist():
+                    res[i][self.urls[repo_id]] = None
+        return [list(urls) for urls in res]
+
+    def add_repo(self, url: str, index_folder: str):
+        """schedule the blobs of a repository index to be added by the next `flush`"""
+        self.pending.append((url, index_folder))
+
+    def flush(self):
+        """write the blobs of the pending repositories that are not indexed yet to a new segment"""
+        if not self.pending:
+            return
+        with self._lock():
+            # other processes may have added repositories since the meta was loaded
+            meta = self._read_meta()
+            repo_ids = {repo[0]: i for i, repo in enumerate(meta["repos"])}
+            blobs, repos = [], []
+            for url, index_folder in self.pending:
+                if not RepoIndex.exists(index_folder):
+                    logger.error(f"{index_folder} is not a complete index, skip {url}")
+                    continue
+                index = RepoIndex(index_folder)
+                if url not in repo_ids:
+                    repo_ids[url] = len(meta["repos"])
+                    meta["repos"].append([url, 0, None])
+                repo_id = repo_ids[url]
+                repo = meta["repos"][repo_id]
+                indexed = repo[1]
+                # repositories added before generations were recorded have none
+                generation = repo[2] if len(repo) > 2 else None
+                # all blobs of a rebuilt index are added again, as their ids may have changed
+                if generation != index.generation or indexed > len(index.blobs):
+                    indexed = 0
+                new_blobs = index.blobs[indexed:]
+                blobs.append(np.asarray(new_blobs))
+                repos.append(np.full(len(new_blobs), repo_id, dtype=REPO_DTYPE))
+                meta["repos"][repo_id] = [url, len(index.blobs), index.generation]
+            self.pending = []
+
+            blobs = np.concatenate(blobs) if blobs else np.empty(0, BLOB_DTYPE)
+            repos = np.concatenate(repos) if repos else np.empty(0, REPO_DTYPE)
+            if len(blobs) > 0:
+                self._write_segment(meta, blobs, repos)
+            self._write_meta(meta)
+            self._merge_tiers(meta)
+        logger.info(f"{len(self.urls)} repositories in {self.folder}")
+
+    def _write_segment(self, meta: dict, blobs: np.ndarray, repos: np.ndarray):
+        order = np.argsort(blobs, kind="stable")
+        segment = meta["next_segment"]
+        for name, arr in [("blobs", blobs[order]), ("repos", repos[order])]:
+            with open(self._segment_path(segment, name), "wb") as f:
+                f.write(np.ascontiguousarray(arr).tobytes())
+        meta["segments"].append(segment)
+        meta["next_segment"] = segment + 1
+
+    def _segment_size(self, segment: int) -> int:
+        return (
+            os.path.getsize(self._segment_path(segment, "blobs")) // BLOB_DTYPE.itemsize
+        )
+
+    def _merge_tiers(self, meta: dict):
+        while True:
+            tiers = {}
+            for segment in meta["segments"]:
+                size, tier = self._segment_size(segment), 0
+                while size >= self.merge_factor:
+                    size //= self.merge_factor
+                    tier += 1
+                tiers.setdefault(tier, []).append(segment)
+            full = [
+                segments
+                for _, segments in sorted(tiers.items())
+                if len(segments) >= self.merge_factor
+            ]
+            if not full:
+                return
+            # the smallest tier first, the merged segment may fill the next tier
+            self._merge(meta, full[0][: self.merge_factor])
+
+    def _merge(self, meta: dict, segments: list[int]):
+        blobs = np.concatenate(
+            [load_array(self._segment_path(i, "blobs"), BLOB_DTYPE) for i in segments]
+        )
+        repos = np.concatenate(
+            [load_array(self._segment_path(i, "repos"), REPO_DTYPE) for i in segments]
+        )
+        meta["segments"] = [i for i in meta["segments"] if i not in segments]
+        self._write_segment(meta, blobs, repos)
+        self._write_meta(meta)
+        # readers keep the old segments mapped, the files are only unlinked
+        for segment in segments:
+            for name in ["blobs", "repos"]:
+                os.remove(self._segment_path(segment, name))
+        logger.info(f"merged {len(segments)} segments of {self.folder}")
+
+    def compact(self):
+        """merge all segments into one"""
+        with self._lock():
+            meta = self._read_meta()
+            if len(meta["segments"]) > 1:
+                self._merge(meta, list(meta["segments"]))
+
+
+def build(base_folder: str, batch_size: int = 1000) -> BlobIndex:
+    """add every indexed repository under `base_folder` to the host-wide blob index"""
+    blob_index = BlobIndex(os.path.join(base_folder, "blob_index"))
+    for i, meta_path in enumerate(
+        sorted(Path(base_folder, "repository").glob("*/*/*/index/meta.json")),
+        start=1,
+    ):
+        forge, user, repo = meta_path.parts[-5:-2]
+        blob_index.add_repo(f"https://{forge}/{user}/{repo}", str(meta_path.parent))
+        if i % batch_size == 0:
+            blob_index.flush()
+    blob_index.flush()
+    blob_index.compact()
+    return blob_index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base_folder", type=str, required=True)
+    args = parser.parse_args()
+    blob_index = build(args.base_folder)
+    print(f"{len(blob_index)} blobs of {len(blob_index.urls)} repositories")
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from typing import Optional
+
+from pyradar.utils import DistReader
+
+logger = logging.getLogger(__name__)
+
+# the cache of `$DATA_HOME`
+DIST_CACHE_FILE = "dist_cache.sqlite"
+
+# bump when `DistReader.file_shas` returns different results for the same archive
+READER_VERSION = 1
+
+
+def file_sha256(file_path: str, chunk_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class DistCache:
+    def __init__(self, path: str) -> None:
+        """A persistent cache of the files of distribution archives shared by all processes on the host.
+
+        Reading a distribution decompresses and hashes every file in it, while the result only
+        depends on the archive content and the reader options. The (path, git blob sha) pairs
+        returned by `DistReader.file_shas` are stored in a SQLite database in WAL mode, keyed by
+        the sha256 of the archive (which PyPI publishes as `digests.sha256`), `translate_newline`
+        and `READER_VERSION`. The digests of `DistReader.file_digests` are stored in a separate table.
+
+        Args:
+            path (str): the path of the SQLite database, e.g., `$DATA_HOME/dist_cache.sqlite`
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # connect lazily, so that the cache can be created before worker processes fork
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            for table in ("dist", "dist_digests"):
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    "sha256 BLOB, translate_newline INTEGER, version INTEGER, files TEXT NOT NULL, "
+                    "PRIMARY KEY (sha256, translate_newline, version)) WITHOUT ROWID"
+                )
+        return self._conn
+
+    def get(
+        self, sha256: str, translate_newline: bool = False, digests: bool = False
+    ) -> Optional[list[tuple]]:
+        """the cached files (or file digests if `digests`) of an archive, None if it is not cached yet"""
+        table = "dist_digests" if digests else "dist"
+        row = self.conn.execute(
+            f"SELECT files FROM {table} WHERE sha256 = ? AND translate_newline = ? AND version = ?",
+            (bytes.fromhex(sha256), int(translate_newline), READER_VERSION),
+        ).fetchone()
+        if row is None:
+            return None
+        return [tuple(file) for file in json.loads(row[0])]
+
+    def put(
+        self,
+        sha256: str,
+        translate_newline: bool,
+        files: list[tuple],
+        digests: bool = False,
+    ):
+        table = "dist_digests" if digests else "dist"
+        try:
+            with self.conn:
+                self.conn.execute(
+                    f"INSERT OR REPLACE INTO {table} (sha256, translate_newline, version, files) VALUES (?, ?, ?, ?)",
+                    (
+                        bytes.fromhex(sha256),
+                        int(translate_newline),
+                        READER_VERSION,
+                        json.dumps(files),
+                    ),
+                )
+        except sqlite3.OperationalError as e:
+            # the cache is only a cache, the files are read again next time
+            logger.error(f"Failed to write distribution cache {self.path}: {e}")
+
+    def file_shas(
+        self,
+        file_path: str,
+        translate_newline: bool = False,
+        sha256: Optional[str] = None,
+        **options,
+    ) -> list[tuple[str, str]]:
+        """the (path, git blob sha) pairs of the files of a distribution, see `DistReader.file_shas`
+
+        Args:
+            file_path (str): the path of the distribution archive
+            translate_newline (bool, optional): see `DistReader`. Defaults to False.
+            sha256 (Optional[str], optional): the sha256 of the archive, e.g., from the PyPI
+                metadata. Computed from the file if None. Defaults to None.
+            options: other options of `DistReader` that do not change the results, e.g., `streaming`
+        """
+        sha256 = sha256 or file_sha256(file_path)
+        files = self.get(sha256, translate_newline)
+        if files is not None:
+            self.hits += 1
+            return files
+        self.misses += 1
+        files = DistReader(file_path, translate_newline, **options).file_shas()
+        self.put(sha256, translate_newline, files)
+        return files
+
+    def file_digests(
+        self,
+        file_path: str,
+        translate_newline: bool = False,
+        sha256: Optional[str] = None,
+        **options,
+    ) -> list[tuple[str, str, Optional[str], str]]:
+        """the digests of the files of a distribution, see `DistReader.file_digests` and `file_shas`"""
+        sha256 = sha256 or file_sha256(file_path)
+        files = self.get(sha256, translate_newline, digests=True)
+        if files is not None:
+            self.hits += 1
+            return files
+        self.misses += 1
+        files = DistReader(file_path, translate_newline, **options).file_digests()
+        self.put(sha256, translate_newline, files, digests=True)
+        return files
+
+    def __enter__(self) -> "DistCache":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        logger.info(
+            f"distribution cache {self.path}: {self.hits} hits, {self.misses} misses"
+        )
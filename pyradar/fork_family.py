@@ -0,0 +1,107 @@
+import logging
+import os
+import sqlite3
+import tempfile
+from typing import Optional
+
+from git import GitDB, Repo
+
+logger = logging.getLogger(__name__)
+
+
+def root_commits(repo: Repo) -> list[str]:
+    """the shas of the commits without parents reachable from any ref"""
+    return repo.git.rev_list("--max-parents=0", "--all").split()
+
+
+class ForkFamilies:
+    def __init__(self, path: str) -> None:
+        """A registry of fork families that share one git object store.
+
+        Forks and mirrors of a project share its root commits. Before cloning, the commits
+        of a repository are fetched without trees and blobs (`--filter=tree:0`) to find its
+        root commits. If a repository with one of these roots is already on disk, the new
+        clone borrows its objects through git alternates (`--reference`) and only
+        stores the objects that the family does not have yet.
+
+        A repository referenced by others must never be removed, and it must never prune
+        objects, because the members read them through alternates. So its `gc.pruneExpire`
+        is set to `never`.
+
+        Args:
+            path (str): the path of the SQLite database mapping root commits to repository paths
+        """
+        self.path = path
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS root (sha TEXT PRIMARY KEY, repo_path TEXT NOT NULL)"
+            )
+        return self._conn
+
+    def probe_roots(self, url: str, work_folder: Optional[str] = None) -> list[str]:
+        """list the root commits of a remote repository by fetching its commits only"""
+        with tempfile.TemporaryDirectory(dir=work_folder) as tmp:
+            try:
+                repo = Repo.clone_from(url, tmp, bare=True, filter="tree:0")
+                roots = root_commits(repo)
+                repo.close()
+                return roots
+            except Exception as e:
+                logger.error(f"Failed to probe root commits of {url}: {e}")
+                return []
+
+    def reference(self, roots: list[str]) -> Optional[str]:
+        """the path of a repository on disk sharing any of the root commits, None if no such repository"""
+        for sha in roots:
+            row = self.conn.execute(
+                "SELECT repo_path FROM root WHERE sha = ?", (sha,)
+            ).fetchone()
+            if row and os.path.exists(row[0]):
+                return row[0]
+        return None
+
+    def register(self, repo: Repo):
+        """add the root commits of a repository, the first repository of a root stays its reference"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO root (sha, repo_path) VALUES (?, ?)",
+                [(sha, repo.git_dir) for sha in root_commits(repo)],
+            )
+        # members read the objects of the repository through alternates
+        repo.git.config("gc.pruneExpire", "never")
+
+    def clone(self, url: str, repo_path: str, **options) -> Repo:
+        """clone a repository, borrowing the objects of its fork family if one is on disk
+
+        Args:
+            url (str): the remote url
+            repo_path (str): the path to clone to
+            options: other options of `git clone`, e.g., `filter="blob:none"`
+
+        Raises:
+            GitCommandError: if failed to clone the repository
+        """
+        parent = os.path.dirname(repo_path)
+        os.makedirs(parent, exist_ok=True)
+        reference = self.reference(self.probe_roots(url, parent))
+        if reference:
+            logger.info(f"Clone {url} with the objects of {reference}")
+            repo = Repo.clone_from(
+                url, repo_path, odbt=GitDB, reference=reference, **options
+            )
+        else:
+            repo = Repo.clone_from(url, repo_path, odbt=GitDB, **options)
+        self.register(repo)
+        return repo
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
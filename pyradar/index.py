@@ -0,0 +1,858 @@
+import json
+import logging
+import os
+import uuid
+from functools import cached_property
+from typing import Iterable, Optional
+
+import numpy as np
+
+from pyradar.utils import CacheDict
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 5
+
+BLOB_DTYPE = np.dtype("S20")
+OFFSET_DTYPE = np.dtype("<i8")
+# `base` is the id of the commit a snapshot is delta-encoded against, -1 for full checkpoints,
+# `depth` is the number of deltas between the commit and its checkpoint,
+# and `num_blobs` is the number of distinct blobs in the snapshot
+COMMIT_DTYPE = np.dtype(
+    [
+        ("sha", "S20"),
+        ("ts", "<i8"),
+        ("base", "<i4"),
+        ("depth", "<i4"),
+        ("num_blobs", "<i4"),
+    ]
+)
+EDGE_DTYPE = np.dtype([("blob", "<u4"), ("filename", "<u4")])
+# an edge viewed as a single integer, used to diff and merge snapshots
+EDGE_KEY_DTYPE = np.dtype("<u8")
+# an edge as `blob id << 32 | filename id`, so that sorted keys are grouped by blob
+PATH_KEY_DTYPE = np.dtype("<u8")
+# the first-seen timestamp of blobs that are not in any appended commit yet
+MAX_TS = np.iinfo(OFFSET_DTYPE).max
+# a first-seen (timestamp, commit id) of a blob that changed since `blob_ts.bin` was last rebuilt
+TS_LOG_DTYPE = np.dtype([("blob", "<u4"), ("ts", "<i8"), ("commit", "<i4")])
+
+# the number of smallest blob keys kept as the bottom-k MinHash sketch of a snapshot
+SKETCH_SIZE = 64
+SKETCH_DTYPE = np.dtype("<u8")
+# pads the sketches of snapshots with fewer than `SKETCH_SIZE` distinct blobs
+EMPTY_KEY = np.iinfo(SKETCH_DTYPE).max
+
+
+def hex_to_bin(shas: Iterable[str]) -> np.ndarray:
+    """convert hex shas to an array of 20-byte binary shas"""
+    return np.array([bytes.fromhex(sha) for sha in shas], dtype=BLOB_DTYPE)
+
+
+def bin_to_hex(shas: np.ndarray) -> list[str]:
+    """convert an array of 20-byte binary shas to hex shas"""
+    # numpy strips trailing null bytes from `S20` items, so go through the raw buffer
+    data = np.ascontiguousarray(shas).tobytes().hex()
+    return [data[i : i + 40] for i in range(0, len(data), 40)]
+
+
+def edge_keys(edges: np.ndarray) -> np.ndarray:
+    """sorted unique integer keys of (blob id, filename id) records"""
+    return np.unique(np.ascontiguousarray(edges, dtype=EDGE_DTYPE).view(EDGE_KEY_DTYPE))
+
+
+def blob_keys(shas: Iterable[str]) -> np.ndarray:
+    """sorted unique 64-bit keys of hex blob shas, i.e., their first 8 bytes
+
+    Blob shas are uniformly distributed, so the keys already are random hash values
+    and the smallest keys of a set of blobs form its bottom-k MinHash sketch.
+    """
+    raw = np.frombuffer(hex_to_bin(shas).tobytes(), dtype="u1").reshape(-1, 20)
+    keys = np.ascontiguousarray(raw[:, :8]).view(">u8").ravel()
+    return np.unique(keys.astype(SKETCH_DTYPE))
+
+
+def make_sketch(keys: np.ndarray) -> np.ndarray:
+    """the bottom-k sketch of sorted unique blob keys"""
+    sketch = np.full(SKETCH_SIZE, EMPTY_KEY, dtype=SKETCH_DTYPE)
+    sketch[: min(len(keys), SKETCH_SIZE)] = keys[:SKETCH_SIZE]
+    return sketch
+
+
+def path_keys(keys: np.ndarray) -> np.ndarray:
+    """convert edge keys (see `edge_keys`) to blob-major path keys"""
+    edges = keys.view(EDGE_DTYPE)
+    return (edges["blob"].astype(PATH_KEY_DTYPE) << 32) | edges["filename"]
+
+
+def load_array(path: str, dtype: np.dtype) -> np.ndarray:
+    """memory-map a raw binary array file, mmap does not support empty files"""
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class BlobSet:
+    def __init__(self, blobs: np.ndarray) -> None:
+        """A set of blob shas backed by a sorted array of 20-byte binary shas.
+
+        Membership is answered for a whole batch of shas at once with `np.searchsorted`.
+
+        Args:
+            blobs (np.ndarray): sorted 20-byte blob shas, e.g., a memory-mapped `RepoIndex.sorted_blobs`
+        """
+        self.blobs = blobs
+
+    @classmethod
+    def from_hex(cls, shas: Iterable[str]) -> "BlobSet":
+        return cls(np.unique(hex_to_bin(shas)))
+
+    def __len__(self) -> int:
+        return len(self.blobs)
+
+    def __contains__(self, sha: str) -> bool:
+        return bool(self.contains([sha])[0])
+
+    def contains(self, shas: Iterable[str]) -> np.ndarray:
+        """check the membership of hex blob shas
+
+        Args:
+            shas (Iterable[str]): hex blob shas
+
+        Returns:
+            np.ndarray: a boolean array, True if the corresponding sha is in the set
+        """
+        query = hex_to_bin(shas)
+        if len(self.blobs) == 0:
+            return np.zeros(len(query), dtype=bool)
+        pos = np.searchsorted(self.blobs, query)
+        pos[pos == len(self.blobs)] = 0
+        return self.blobs[pos] == query
+
+    def union(self, other: "BlobSet") -> "BlobSet":
+        return BlobSet(np.union1d(self.blobs, other.blobs))
+
+
+class RepoIndex:
+    """A columnar, memory-mapped index of the blobs, filenames and commits of a repository.
+
+    The index is a folder of raw little-endian arrays:
+
+    - `blobs.bin`: 20-byte blob shas, the blob id is the position in this array
+    - `blob_order.bin` and `sorted_blobs.bin`: the permutation of blob ids that sorts
+      `blobs.bin`, and the sorted blob shas themselves
+    - `filenames.bin` and `filename_offsets.bin`: the utf-8 encoded filenames and their
+      offsets, the filename id is the position in the offsets array. Git paths are bytes,
+      the ones that are not valid utf-8 round-trip through `surrogateescape`
+    - `commits.bin`: (20-byte sha, authored timestamp, delta base, delta depth) records
+      in traversal order
+    - `edge_offsets.bin` and `edges.bin`: CSR arrays of the (blob id, filename id) records
+      added by the i-th commit, i.e., `edges[edge_offsets[i] : edge_offsets[i + 1]]`
+    - `removed_offsets.bin` and `removed.bin`: CSR arrays of the records removed by the i-th commit
+    - `blob_ts.bin` and `blob_commits.bin`: the earliest authored timestamp of the commits
+      containing each blob, and the id of that commit
+    - `blob_paths.bin`: the sorted distinct (blob id, filename id) records of all commits as
+      path keys (see `path_keys`), i.e., the inverted index of the paths of each blob
+    - `blob_ts_log.bin`: the first-seen timestamps and commits that changed after `blob_ts.bin`
+      and `blob_commits.bin` were last rebuilt
+    - `sketches.bin`: the bottom-k MinHash sketch of the blobs of each commit (see `blob_keys`),
+      used to find the commits most similar to a set of blobs without materializing snapshots
+    - `meta.json`: the format version, array lengths, the traversal window `until`, and the
+      `generation` of the index, which is drawn anew whenever the index is built from scratch
+
+    Most commits only touch a handful of files, so a snapshot is stored as a delta against
+    its first parent. Every `checkpoint_interval` deltas (or when the parent is not at hand
+    while writing) a full snapshot is stored instead, which bounds the chain of deltas
+    `snapshot` has to apply to materialize a commit.
+
+    The index may be built for a window of the history only, i.e., the commits authored
+    up to `until` (None if all commits are indexed, -1 if no window is complete yet).
+    A later, wider window appends the remaining commits to the same index.
+
+    Arrays are only ever appended to, so ids stay stable when the index is extended
+    with new commits. `meta.json` is replaced last and the arrays are sliced to the
+    lengths it records, so an interrupted append is invisible to readers. Data derived
+    from a prefix of the blob ids (e.g., `BlobIndex`) records the `generation` with the
+    prefix length, as the ids of a rebuilt index may differ even when it is not shorter.
+
+    The sorted and inverted arrays (`blob_order.bin`, `sorted_blobs.bin`, `blob_ts.bin`,
+    `blob_commits.bin` and `blob_paths.bin`) are only rebuilt when a traversal completes.
+    Until then they lag behind the appended commits, which `meta.json` records by covering
+    no window (`until` is -1), and a resumed traversal picks up the lagging blobs from
+    `blobs.bin`, `edges.bin` and `blob_ts_log.bin`.
+
+    All arrays are opened with `np.memmap`, so workers that load the same index share pages.
+    """
+
+    def __init__(self, folder: str, cache_size: int = 64) -> None:
+        self.folder = folder
+        with open(os.path.join(folder, "meta.json")) as f:
+            self.meta = json.load(f)
+        # recently materialized snapshots, as sorted edge keys
+        self.snapshot_cache = CacheDict(cache_len=cache_size)
+
+    @staticmethod
+    def exists(folder: str) -> bool:
+        """whether a complete index of the current format exists in `folder`"""
+        meta_path = os.path.join(folder, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path) as f:
+            return json.load(f).get("version") == INDEX_VERSION
+
+    def _load(self, name: str, dtype: np.dtype, length: int) -> np.ndarray:
+        return load_array(os.path.join(self.folder, name), dtype)[:length]
+
+    @cached_property
+    def blobs(self) -> np.ndarray:
+        """20-byte blob shas indexed by blob id"""
+        return self._load("blobs.bin", BLOB_DTYPE, self.meta["num_blobs"])
+
+    @property
+    def num_sorted_blobs(self) -> int:
+        """the number of blobs in the sorted arrays, the blobs after them are not sorted yet"""
+        return self.meta.get("num_sorted_blobs", self.meta["num_blobs"])
+
+    @cached_property
+    def blob_order(self) -> np.ndarray:
+        return self._load("blob_order.bin", OFFSET_DTYPE, self.num_sorted_blobs)
+
+    @cached_property
+    def sorted_blobs(self) -> np.ndarray:
+        """sorted 20-byte blob shas"""
+        return self._load("sorted_blobs.bin", BLOB_DTYPE, self.num_sorted_blobs)
+
+    @cached_property
+    def blob_set(self) -> "BlobSet":
+        return BlobSet(self.sorted_blobs)
+
+    @cached_property
+    def blob_ts(self) -> np.ndarray:
+        """the earliest authored timestamp of the commits containing each blob, indexed by blob id"""
+        return self._load("blob_ts.bin", OFFSET_DTYPE, self.num_sorted_blobs)
+
+    @property
+    def generation(self) -> Optional[str]:
+        """a random id of the build of the index that appends keep, None for older indexes"""
+        return self.meta.get("generation")
+
+    @property
+    def until(self) -> Optional[int]:
+        """all commits authored up to this timestamp are indexed, None if all commits are indexed"""
+        return self.meta["until"]
+
+    def covers(self, until: Optional[int]) -> bool:
+        """whether all commits authored up to `until` (all commits if None) are indexed"""
+        return self.until is None or (until is not None and until <= self.until)
+
+    @cached_property
+    def blob_commits(self) -> np.ndarray:
+        """the id of the earliest commit containing each blob, indexed by blob id"""
+        return self._load("blob_commits.bin", np.dtype("<i4"), self.num_sorted_blobs)
+
+    @cached_property
+    def blob_paths(self) -> np.ndarray:
+        return self._load("blob_paths.bin", PATH_KEY_DTYPE, self.meta["num_blob_paths"])
+
+    def blob_history(
+        self, blob_shas: list[str]
+    ) -> list[Optional[tuple[str, int, list[str]]]]:
+        """where and when blobs first appeared in the repository
+
+        Args:
+            blob_shas (list[str]): hex blob shas
+
+        Returns:
+            list[Optional[tuple[str, int, list[str]]]]: for each blob, the earliest commit containing it,
+                the authored timestamp of that commit, and all paths the blob ever had; None if the blob
+                is not in the index
+        """
+        ids = self.blob_ids(blob_shas)
+        found = np.flatnonzero(ids >= 0)
+        found_ids = ids[found].astype(PATH_KEY_DTYPE)
+        starts = np.searchsorted(self.blob_paths, found_ids << 32)
+        ends = np.searchsorted(self.blob_paths, (found_ids + 1) << 32)
+        commit_ids = self.blob_commits[found_ids]
+        commit_shas = bin_to_hex(self.commits["sha"][commit_ids])
+
+        res = [None] * len(ids)
+        for i, blob_id, commit_sha, start, end in zip(
+            found.tolist(), found_ids, commit_shas, starts.tolist(), ends.tolist()
+        ):
+            filename_ids = (self.blob_paths[start:end] & 0xFFFFFFFF).tolist()
+            res[i] = (
+                commit_sha,
+                int(self.blob_ts[blob_id]),
+                [self.filename(fid) for fid in filename_ids],
+            )
+        return res
+
+    def blob_set_until(self, until: int) -> "BlobSet":
+        """the blobs of the commits authored up to `until`"""
+        return BlobSet(self.sorted_blobs[self.blob_ts[self.blob_order] <= until])
+
+    @cached_property
+    def commits(self) -> np.ndarray:
+        """(sha, ts) records of all commits"""
+        return self._load("commits.bin", COMMIT_DTYPE, self.meta["num_commits"])
+
+    @cached_property
+    def sketches(self) -> np.ndarray:
+        """the (num_commits, SKETCH_SIZE) bottom-k sketches of the commits"""
+        return self._load(
+            "sketches.bin", SKETCH_DTYPE, self.meta["num_commits"] * SKETCH_SIZE
+        ).reshape(-1, SKETCH_SIZE)
+
+    @cached_property
+    def edge_offsets(self) -> np.ndarray:
+        return self._load(
+            "edge_offsets.bin", OFFSET_DTYPE, self.meta["num_commits"] + 1
+        )
+
+    @cached_property
+    def edges(self) -> np.ndarray:
+        return self._load("edges.bin", EDGE_DTYPE, self.meta["num_edges"])
+
+    @cached_property
+    def removed_offsets(self) -> np.ndarray:
+        return self._load(
+            "removed_offsets.bin", OFFSET_DTYPE, self.meta["num_commits"] + 1
+        )
+
+    @cached_property
+    def removed(self) -> np.ndarray:
+        return self._load("removed.bin", EDGE_DTYPE, self.meta["num_removed"])
+
+    @cached_property
+    def filename_offsets(self) -> np.ndarray:
+        return self._load(
+            "filename_offsets.bin", OFFSET_DTYPE, self.meta["num_filenames"] + 1
+        )
+
+    @cached_property
+    def filename_data(self) -> np.ndarray:
+        return self._load("filenames.bin", np.dtype("u1"), self.filename_offsets[-1])
+
+    @cached_property
+    def blob_shas(self) -> list[str]:
+        """sorted hex blob shas"""
+        return bin_to_hex(self.sorted_blobs)
+
+    @cached_property
+    def filenames(self) -> list[str]:
+        """filenames indexed by filename id"""
+        data = self.filename_data.tobytes()
+        offsets = self.filename_offsets.tolist()
+        return [
+            data[s:e].decode(errors="surrogateescape")
+            for s, e in zip(offsets[:-1], offsets[1:])
+        ]
+
+    def filename(self, filename_id: int) -> str:
+        start, end = self.filename_offsets[filename_id : filename_id + 2]
+        return self.filename_data[start:end].tobytes().decode(errors="surrogateescape")
+
+    @cached_property
+    def commit_ids(self) -> dict[str, int]:
+        return {sha: i for i, sha in enumerate(bin_to_hex(self.commits["sha"]))}
+
+    def blob_ids(self, blob_shas: Iterable[str]) -> np.ndarray:
+        """the ids of hex blob shas, -1 for blobs that are not in the index"""
+        query = hex_to_bin(blob_shas)
+        ids = np.full(len(query), -1, dtype=OFFSET_DTYPE)
+        if len(self.sorted_blobs) == 0:
+            return ids
+        pos = np.searchsorted(self.sorted_blobs, query)
+        pos[pos == len(self.sorted_blobs)] = 0
+        found = self.sorted_blobs[pos] == query
+        ids[found] = self.blob_order[pos[found]]
+        return ids
+
+    def similar_commits(
+        self, blob_shas: Iterable[str], batch_size: int = 8192
+    ) -> np.ndarray:
+        """estimate the number of given blobs in each commit from the MinHash sketches
+
+        The Jaccard similarity J of the blobs and a snapshot is estimated from the bottom-k
+        sketch of their union, and converted to the overlap |Q & C| = J * (|Q| + |C|) / (1 + J).
+
+        Args:
+            blob_shas (Iterable[str]): hex blob shas, e.g., the blobs of a distribution
+            batch_size (int, optional): the number of commits compared at once. Defaults to 8192.
+
+        Returns:
+            np.ndarray: the estimated overlap of each commit, indexed by commit id
+        """
+        keys = blob_keys(blob_shas)
+        query = make_sketch(keys)
+        query_size = len(keys)
+        sizes = self.commits["num_blobs"].astype(np.float64)
+        overlaps = np.zeros(len(self.commits), dtype=np.float64)
+        for start in range(0, len(self.commits), batch_size):
+            sketches = np.asarray(self.sketches[start : start + batch_size])
+            pos = np.minimum(np.searchsorted(query, sketches), SKETCH_SIZE - 1)
+            shared = (query[pos] == sketches) & (sketches != EMPTY_KEY)
+            # the bottom-k of the union, counting shared keys only once
+            union = np.sort(
+                np.hstack(
+                    [
+                        np.broadcast_to(query, sketches.shape),
+                        np.where(shared, EMPTY_KEY, sketches),
+                    ]
+                ),
+                axis=1,
+            )[:, :SKETCH_SIZE]
+            threshold = union[:, -1:]
+            num_union = (union != EMPTY_KEY).sum(axis=1)
+            num_shared = (shared & (sketches <= threshold)).sum(axis=1)
+            jaccard = num_shared / np.maximum(num_union, 1)
+            overlaps[start : start + len(sketches)] = (
+                jaccard * (query_size + sizes[start : start + len(sketches)])
+            ) / (1 + jaccard)
+        return overlaps
+
+    def contained_blobs(self, blob_shas: Iterable[str]) -> np.ndarray:
+        """count exactly how many of the given blobs each commit contains
+
+        Unlike the Jaccard estimate of `similar_commits`, the containment is not diluted by the size
+        of the snapshot, so a small distribution is ranked correctly against large snapshots. The deltas
+        are replayed in commit order restricted to the records of the given blobs, which are few, and a
+        commit whose delta does not touch them shares the records of its base.
+
+        Args:
+            blob_shas (Iterable[str]): hex blob shas, e.g., the blobs of a distribution
+
+        Returns:
+            np.ndarray: the number of distinct given blobs in each commit, indexed by commit id
+        """
+        ids = self.blob_ids(blob_shas)
+        ids = np.unique(ids[ids >= 0])
+        num_commits = self.meta["num_commits"]
+        counts = np.zeros(num_commits, dtype=np.int64)
+        if len(ids) == 0:
+            return counts
+        added = np.flatnonzero(np.isin(self.edges["blob"], ids))
+        removed = np.flatnonzero(np.isin(self.removed["blob"], ids))
+        # the range of the restricted records of each commit
+        added_bounds = np.searchsorted(added, self.edge_offsets)
+        removed_bounds = np.searchsorted(removed, self.removed_offsets)
+        empty = np.empty(0, dtype=EDGE_KEY_DTYPE)
+        restricted = [empty] * num_commits
+        bases = self.commits["base"]
+        for cid in range(num_commits):
+            base = int(bases[cid])
+            keys = restricted[base] if base >= 0 else empty
+            astart, aend = added_bounds[cid : cid + 2]
+            rstart, rend = removed_bounds[cid : cid + 2]
+            if aend > astart or rend > rstart:
+                keys = np.union1d(
+                    np.setdiff1d(
+                        keys,
+                        edge_keys(self.removed[removed[rstart:rend]]),
+                        assume_unique=True,
+                    ),
+                    edge_keys(self.edges[added[astart:aend]]),
+                )
+                counts[cid] = len(np.unique(keys.view(EDGE_DTYPE)["blob"]))
+            elif base >= 0:
+                counts[cid] = counts[base]
+            restricted[cid] = keys
+        return counts
+
+    def delta(self, commit_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """the (blob id, filename id) records added and removed by a commit relative to its base"""
+        start, end = self.edge_offsets[commit_id : commit_id + 2]
+        rstart, rend = self.removed_offsets[commit_id : commit_id + 2]
+        return self.edges[start:end], self.removed[rstart:rend]
+
+    def snapshot_keys(self, commit_id: int) -> np.ndarray:
+        """the sorted edge keys of a commit, see `edge_keys`"""
+        chain = []
+        cid = commit_id
+        # walk back to a checkpoint or to a snapshot that is already materialized
+        while cid >= 0 and cid not in self.snapshot_cache:
+            chain.append(cid)
+            cid = int(self.commits[cid]["base"])
+        keys = (
+            self.snapshot_cache[cid] if cid >= 0 else np.empty(0, dtype=EDGE_KEY_DTYPE)
+        )
+        for cid in reversed(chain):
+            added, removed = self.delta(cid)
+            keys = np.union1d(
+                np.setdiff1d(keys, edge_keys(removed), assume_unique=True),
+                edge_keys(added),
+            )
+        self.snapshot_cache[commit_id] = keys
+        return keys
+
+    def snapshot(self, commit_id: int) -> np.ndarray:
+        """the (blob id, filename id) records of a commit"""
+        return self.snapshot_keys(commit_id).view(EDGE_DTYPE)
+
+    def commit_files(self, commit_sha: str) -> list[tuple[str, str]]:
+        """the (blob sha, filename) pairs of a commit, as returned by `Repository.snapshot`"""
+        edges = self.snapshot(self.commit_ids[commit_sha])
+        blob_shas = bin_to_hex(self.blobs[edges["blob"]])
+        return [
+            (sha, self.filename(fid)) for sha, fid in zip(blob_shas, edges["filename"])
+        ]
+
+
+class RepoIndexWriter:
+    def __init__(
+        self, folder: str, checkpoint_interval: int = 64, cache_size: int = 256
+    ) -> None:
+        """Create a `RepoIndex` in `folder`, or open an existing one to append new commits.
+
+        Args:
+            folder (str): the index folder
+            checkpoint_interval (int, optional): the maximum number of deltas between a snapshot and
+                its full checkpoint. Defaults to 64.
+            cache_size (int, optional): the number of recent snapshots kept in memory to compute deltas against.
+                Defaults to 256.
+        """
+        self.folder = folder
+        self.checkpoint_interval = checkpoint_interval
+        os.makedirs(folder, exist_ok=True)
+        self.index = RepoIndex(folder) if RepoIndex.exists(folder) else None
+        if self.index:
+            self.meta = dict(self.index.meta)
+            # indexes written before the sorted arrays were rebuilt lazily are always up to date
+            self.meta.setdefault("num_sorted_blobs", self.meta["num_blobs"])
+            self.meta.setdefault("num_path_edges", self.meta["num_edges"])
+            self.meta.setdefault("num_ts_log", 0)
+            filename_size = int(self.index.filename_offsets[-1])
+            self.commit_ids = dict(self.index.commit_ids)
+            self.depths = self.index.commits["depth"].tolist()
+        else:
+            self.meta = {
+                "version": INDEX_VERSION,
+                "num_blobs": 0,
+                "num_filenames": 0,
+                "num_commits": 0,
+                "num_edges": 0,
+                "num_removed": 0,
+                "num_blob_paths": 0,
+                "num_sorted_blobs": 0,
+                "num_path_edges": 0,
+                "num_ts_log": 0,
+                "until": -1,
+                "generation": uuid.uuid4().hex,
+            }
+            filename_size = 0
+            self.commit_ids = {}
+            self.depths = []
+
+        # drop whatever an interrupted append left behind the recorded lengths
+        num_offsets = self.meta["num_filenames"] + 1 if self.index else 0
+        num_edge_offsets = self.meta["num_commits"] + 1 if self.index else 0
+        sizes = {
+            "blobs.bin": self.meta["num_blobs"] * BLOB_DTYPE.itemsize,
+            "filenames.bin": filename_size,
+            "filename_offsets.bin": num_offsets * OFFSET_DTYPE.itemsize,
+            "commits.bin": self.meta["num_commits"] * COMMIT_DTYPE.itemsize,
+            "edge_offsets.bin": num_edge_offsets * OFFSET_DTYPE.itemsize,
+            "edges.bin": self.meta["num_edges"] * EDGE_DTYPE.itemsize,
+            "removed_offsets.bin": num_edge_offsets * OFFSET_DTYPE.itemsize,
+            "removed.bin": self.meta["num_removed"] * EDGE_DTYPE.itemsize,
+            "sketches.bin": self.meta["num_commits"]
+            * SKETCH_SIZE
+            * SKETCH_DTYPE.itemsize,
+            "blob_ts_log.bin": self.meta["num_ts_log"] * TS_LOG_DTYPE.itemsize,
+        }
+        self.files = {}
+        for name, size in sizes.items():
+            f = open(os.path.join(folder, name), "ab")
+            f.truncate(size)
+            self.files[name] = f
+        if not self.index:
+            # offset arrays start with the offset of the first record
+            for name in [
+                "filename_offsets.bin",
+                "edge_offsets.bin",
+                "removed_offsets.bin",
+            ]:
+                self._append(name, np.zeros(1, dtype=OFFSET_DTYPE))
+            # the sorted and inverted arrays are empty until the first `close`
+            for name in [
+                "blob_order.bin",
+                "sorted_blobs.bin",
+                "blob_ts.bin",
+                "blob_commits.bin",
+                "blob_paths.bin",
+            ]:
+                self._replace(name, np.empty(0, dtype="u1"))
+        self.filename_size = filename_size
+        # first-seen timestamps and commits of all blobs, with spare capacity for new blobs
+        num_sorted = self.meta["num_sorted_blobs"]
+        self.blob_ts = np.full(self.meta["num_blobs"], MAX_TS, dtype=OFFSET_DTYPE)
+        self.blob_commits = np.full(self.meta["num_blobs"], -1, dtype="<i4")
+        # ids of the blobs and filenames seen so far, assigned online while commits are appended
+        self.blob_ids: dict[str, int] = {}
+        if self.index:
+            self.blob_ts[:num_sorted] = self.index.blob_ts
+            self.blob_commits[:num_sorted] = self.index.blob_commits
+            self._apply_ts_log()
+            # blobs appended after the sorted arrays were rebuilt are not found by `RepoIndex.blob_ids`
+            pending = bin_to_hex(self.index.blobs[num_sorted:])
+            self.blob_ids.update(zip(pending, range(num_sorted, len(self.blob_ts))))
+        # ids of the blobs whose first-seen timestamp changed since the last commit
+        self.changed_blobs = []
+        # the number of delta records appended since the last commit
+        self.num_pending = 0
+        self.snapshot_cache = CacheDict(cache_len=cache_size)
+        self.filename_ids: dict[str, int] = (
+            {fn: i for i, fn in enumerate(self.index.filenames)} if self.index else {}
+        )
+
+    def _append(self, name: str, arr: np.ndarray):
+        self.files[name].write(np.ascontiguousarray(arr).tobytes())
+
+    def _apply_ts_log(self):
+        log = load_array(os.path.join(self.folder, "blob_ts_log.bin"), TS_LOG_DTYPE)
+        log = log[: self.meta["num_ts_log"]]
+        if len(log) == 0:
+            return
+        # timestamps only ever decrease, so the earliest record of each blob is the latest one
+        log = log[np.argsort(log["ts"], kind="stable")]
+        _, first = np.unique(log["blob"], return_index=True)
+        log = log[first]
+        self.blob_ts[log["blob"]] = log["ts"]
+        self.blob_commits[log["blob"]] = log["commit"]
+
+    def add_blobs(self, blob_shas: list[str]) -> list[int]:
+        """assign ids to hex blob shas, unseen blobs get the next free ids in the given order
+
+        Returns:
+            list[int]: the id of each given blob sha
+        """
+        unknown = [sha for sha in dict.fromkeys(blob_shas) if sha not in self.blob_ids]
+        if unknown:
+            arr = hex_to_bin(unknown)
+            if self.index:
+                ids = self.index.blob_ids(unknown)
+            else:
+                ids = np.full(len(arr), -1, dtype=OFFSET_DTYPE)
+            new = ids < 0
+            ids[new] = self.meta["num_blobs"] + np.arange(new.sum())
+            num_blobs = self.meta["num_blobs"] + int(new.sum())
+            if num_blobs > len(self.blob_ts):
+                capacity = max(num_blobs, 2 * len(self.blob_ts))
+                blob_ts = np.full(capacity, MAX_TS)
+                blob_ts[: len(self.blob_ts)] = self.blob_ts
+                self.blob_ts = blob_ts
+                blob_commits = np.full(capacity, -1, dtype="<i4")
+                blob_commits[: len(self.blob_commits)] = self.blob_commits
+                self.blob_commits = blob_commits
+            self._append("blobs.bin", arr[new])
+            self.meta["num_blobs"] += int(new.sum())
+            self.blob_ids.update(zip(unknown, ids.tolist()))
+        return [self.blob_ids[sha] for sha in blob_shas]
+
+    def add_filenames(self, filenames: list[str]) -> list[int]:
+        """assign ids to filenames, unseen filenames get the next free ids in the given order
+
+        Returns:
+            list[int]: the id of each given filename
+        """
+        encoded = []
+        for fn in filenames:
+            if fn not in self.filename_ids:
+                self.filename_ids[fn] = self.meta["num_filenames"] + len(encoded)
+                encoded.append(fn.encode(errors="surrogateescape"))
+        if encoded:
+            offsets = self.filename_size + np.cumsum(
+                [len(fn) for fn in encoded], dtype=OFFSET_DTYPE
+            )
+            self._append("filenames.bin", np.frombuffer(b"".join(encoded), dtype="u1"))
+            self._append("filename_offsets.bin", offsets)
+            self.filename_size = int(offsets[-1])
+            self.meta["num_filenames"] += len(encoded)
+        return [self.filename_ids[fn] for fn in filenames]
+
+    def _parent_keys(self, parent_id: int) -> Optional[np.ndarray]:
+        if parent_id in self.snapshot_cache:
+            return self.snapshot_cache[parent_id]
+        if self.index and parent_id < self.index.meta["num_commits"]:
+            return self.index.snapshot_keys(parent_id)
+        return None
+
+    def append_commit(
+        self,
+        commit_sha: str,
+        ts: int,
+        files: list[tuple[str, str]],
+        parent_sha: Optional[str] = None,
+    ):
+        """append a commit and its files, ids are assigned to unseen blobs and filenames on the fly
+
+        Args:
+            commit_sha (str): the commit sha
+            ts (int): the authored timestamp
+            files (list[tuple[str, str]]): the (blob sha, filename) pairs of the commit
+            parent_sha (Optional[str], optional): the first parent of the commit. Defaults to None.
+        """
+        commit_id = self.meta["num_commits"]
+        edges = np.empty(len(files), dtype=EDGE_DTYPE)
+        edges["blob"] = self.add_blobs([sha for sha, _ in files])
+        edges["filename"] = self.add_filenames([fn for _, fn in files])
+        blob_ids = np.unique(edges["blob"])
+        earlier = blob_ids[ts < self.blob_ts[blob_ids]]
+        self.blob_ts[earlier] = ts
+        self.blob_commits[earlier] = commit_id
+        self.changed_blobs.append(earlier)
+        keys = edge_keys(edges)
+        base, depth = -1, 0
+        added, removed = keys, np.empty(0, dtype=EDGE_KEY_DTYPE)
+
+        parent_id = self.commit_ids.get(parent_sha, -1)
+        if parent_id >= 0 and self.depths[parent_id] + 1 < self.checkpoint_interval:
+            parent_keys = self._parent_keys(parent_id)
+            if parent_keys is not None:
+                delta_added = np.setdiff1d(keys, parent_keys, assume_unique=True)
+                delta_removed = np.setdiff1d(parent_keys, keys, assume_unique=True)
+                # fall back to a checkpoint if the delta is not smaller
+                if len(delta_added) + len(delta_removed) < len(keys):
+                    base, depth = parent_id, self.depths[parent_id] + 1
+                    added, removed = delta_added, delta_removed
+
+        unique_keys = blob_keys(sha for sha, _ in files)
+        record = np.array(
+            [(bytes.fromhex(commit_sha), ts, base, depth, len(unique_keys))],
+            dtype=COMMIT_DTYPE,
+        )
+        self._append("commits.bin", record)
+        self._append("sketches.bin", make_sketch(unique_keys))
+        self._append("edges.bin", added.view(EDGE_DTYPE))
+        self._append("removed.bin", removed.view(EDGE_DTYPE))
+        self.num_pending += len(added) + len(removed)
+        self.meta["num_edges"] += len(added)
+        self.meta["num_removed"] += len(removed)
+        self._append(
+            "edge_offsets.bin", np.array([self.meta["num_edges"]], dtype=OFFSET_DTYPE)
+        )
+        self._append(
+            "removed_offsets.bin",
+            np.array([self.meta["num_removed"]], dtype=OFFSET_DTYPE),
+        )
+        self.meta["num_commits"] += 1
+        self.commit_ids[commit_sha] = commit_id
+        self.depths.append(depth)
+        self.snapshot_cache[commit_id] = keys
+
+    def append_index(self, other: RepoIndex):
+        """append all commits of another index, e.g., the partial index of a range of commits built
+        by a worker process, and remap its blob and filename ids to the ids of this index
+
+        The commits keep their encoding, so the first commit of `other` stays a full checkpoint.
+        """
+        blob_ids = np.asarray(
+            self.add_blobs(bin_to_hex(other.blobs)), dtype=OFFSET_DTYPE
+        )
+        filename_ids = np.asarray(
+            self.add_filenames(other.filenames), dtype=OFFSET_DTYPE
+        )
+        commit_offset = self.meta["num_commits"]
+        earlier = other.blob_ts < self.blob_ts[blob_ids]
+        self.blob_ts[blob_ids[earlier]] = other.blob_ts[earlier]
+        self.blob_commits[blob_ids[earlier]] = (
+            other.blob_commits[earlier] + commit_offset
+        )
+        self.changed_blobs.append(blob_ids[earlier])
+
+        commits = np.array(other.commits)
+        commits["base"][commits["base"] >= 0] += commit_offset
+        for name, records in [
+            ("edges.bin", other.edges),
+            ("removed.bin", other.removed),
+        ]:
+            remapped = np.empty(len(records), dtype=EDGE_DTYPE)
+            remapped["blob"] = blob_ids[records["blob"]]
+            remapped["filename"] = filename_ids[records["filename"]]
+            self._append(name, remapped)
+        self._append("commits.bin", commits)
+        self._append("sketches.bin", other.sketches)
+        self._append(
+            "edge_offsets.bin", other.edge_offsets[1:] + self.meta["num_edges"]
+        )
+        self._append(
+            "removed_offsets.bin", other.removed_offsets[1:] + self.meta["num_removed"]
+        )
+        self.meta["num_edges"] += len(other.edges)
+        self.meta["num_removed"] += len(other.removed)
+        self.meta["num_commits"] += len(commits)
+        self.num_pending += len(other.edges) + len(other.removed)
+        self.commit_ids.update(
+            (sha, commit_offset + i) for sha, i in other.commit_ids.items()
+        )
+        self.depths.extend(commits["depth"].tolist())
+
+    def _replace(self, name: str, arr: np.ndarray):
+        # readers may still have the old file mapped, so never rewrite it in place
+        tmp_path = os.path.join(self.folder, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(np.ascontiguousarray(arr).tobytes())
+        os.replace(tmp_path, os.path.join(self.folder, name))
+
+    def _write_meta(self, meta: dict):
+        tmp_path = os.path.join(self.folder, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.folder, "meta.json"))
+
+    def commit(self):
+        """make the commits appended so far visible to readers and to a resumed traversal
+
+        Only the appended arrays and the changed first-seen timestamps are written, the sorted
+        and inverted arrays are rebuilt by `close`, so the index covers no window until then.
+        """
+        if self.changed_blobs:
+            changed = np.unique(np.concatenate(self.changed_blobs))
+            log = np.empty(len(changed), dtype=TS_LOG_DTYPE)
+            log["blob"] = changed
+            log["ts"] = self.blob_ts[changed]
+            log["commit"] = self.blob_commits[changed]
+            self._append("blob_ts_log.bin", log)
+            self.meta["num_ts_log"] += len(log)
+            self.changed_blobs = []
+        for f in self.files.values():
+            f.flush()
+        self._write_meta({**self.meta, "until": -1})
+        self.num_pending = 0
+        logger.info(f"commit {self.meta['num_commits']} commits to {self.folder}")
+
+    def close(self):
+        """rebuild the sorted and inverted arrays of all appended commits and commit the index"""
+        for f in self.files.values():
+            f.flush()
+        num_blobs = self.meta["num_blobs"]
+        blobs = load_array(os.path.join(self.folder, "blobs.bin"), BLOB_DTYPE)
+        blobs = blobs[:num_blobs]
+        order = np.argsort(blobs, kind="stable").astype(OFFSET_DTYPE)
+        self._replace("blob_order.bin", order)
+        self._replace("sorted_blobs.bin", blobs[order])
+        self._replace("blob_ts.bin", self.blob_ts[:num_blobs])
+        self._replace("blob_commits.bin", self.blob_commits[:num_blobs])
+        # every record of a snapshot was added by the commit itself or one of its bases,
+        # so the added records of all commits cover the paths of every blob
+        blob_paths = (
+            self.index.blob_paths if self.index else np.empty(0, PATH_KEY_DTYPE)
+        )
+        edges = load_array(os.path.join(self.folder, "edges.bin"), EDGE_DTYPE)
+        edges = edges[self.meta["num_path_edges"] : self.meta["num_edges"]]
+        if len(edges) > 0:
+            new_paths = path_keys(np.ascontiguousarray(edges).view(EDGE_KEY_DTYPE))
+            blob_paths = np.union1d(blob_paths, new_paths)
+        self._replace("blob_paths.bin", blob_paths)
+        self.meta["num_blob_paths"] = len(blob_paths)
+        self.meta["num_sorted_blobs"] = num_blobs
+        self.meta["num_path_edges"] = self.meta["num_edges"]
+        self.meta["num_ts_log"] = 0
+        self._write_meta(self.meta)
+        self.changed_blobs = []
+        self.num_pending = 0
+        logger.info(f"close {self.meta['num_commits']} commits in {self.folder}")
+        # the log is obsolete once the rebuilt arrays are visible
+        self.files["blob_ts_log.bin"].truncate(0)
+        for f in self.files.values():
+            f.close()
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from git import GitCommandError
+
+from pyradar.repository import Repository, assemble_repo_folder
+
+logger = logging.getLogger(__name__)
+
+# the summary of the last maintenance, next to the `repo` folder of a repository
+MAINTENANCE_FILE = "maintenance.json"
+
+# repack all packs into one when a repository has more packs than this, e.g., after many fetches
+MAX_PACKS = 16
+
+
+def count_objects(repository: Repository) -> dict[str, int]:
+    """the loose and packed object statistics of `git count-objects -v`"""
+    stats = {}
+    for line in repository.repo.git.count_objects("-v").split("\n"):
+        key, _, value = line.partition(": ")
+        if value.isdigit():
+            stats[key] = int(value)
+    return stats
+
+
+def time_listing(repository: Repository) -> dict[str, float]:
+    """the time (in seconds) to list all objects and all commits of a repository"""
+    timings = {}
+    for attr in ("object_shas", "commit_shas"):
+        repository.__dict__.pop(attr, None)
+        if attr == "commit_shas":
+            repository.__dict__.pop("commit_log", None)
+        start = time.perf_counter()
+        getattr(repository, attr)
+        timings[attr] = time.perf_counter() - start
+    return timings
+
+
+def maintain(
+    url: str,
+    base_folder: str,
+    full: bool = False,
+    threads: int = 1,
+    timings: bool = True,
+) -> Optional[dict]:
+    """optimize the object store of a cloned repository for history walks and object listing
+
+    1. repack: pack loose objects into a new pack, or all packs into one if `full` or when there
+       are more than `MAX_PACKS` packs. Objects borrowed from alternates are never copied (`-l`),
+       and fork family references (see `ForkFamilies`) keep their unreachable objects.
+    2. commit-graph: write the commit-graph with changed-path Bloom filters, which speeds up
+       `git log --topo-order` and path-limited walks such as `git log -- .gitmodules`.
+    3. multi-pack-index: index all packs at once, with a reachability bitmap if the repository
+       has all the objects (i.e., it is neither a partial clone nor a fork family member).
+
+    A failed step is logged and recorded, and the remaining steps still run.
+
+    Args:
+        url (str): the remote repository url
+        base_folder (str): the folder that stores repository and relevant data.
+        full (bool, optional): repack all packs into one. Defaults to False.
+        threads (int, optional): the number of threads git may use to repack. Defaults to 1.
+        timings (bool, optional): record the time to list objects and commits before and after.
+            Defaults to True.
+
+    Returns:
+        Optional[dict]: the maintenance summary, None if the repository is not cloned
+    """
+    # never clone a repository only to maintain it
+    if not os.path.exists(os.path.join(assemble_repo_folder(url, base_folder), "repo")):
+        return None
+    repository = Repository(url, base_folder, tree_memo=False)
+    if not repository.repo:
+        return None
+    git = repository.repo.git
+    summary = {"url": repository.url, "time": int(time.time()), "steps": {}}
+    if timings:
+        summary["before"] = time_listing(repository)
+    summary["objects_before"] = count_objects(repository)
+
+    def run(step: str, *args: str) -> bool:
+        start = time.perf_counter()
+        try:
+            git.execute(["git", "-c", f"pack.threads={threads}", *args])
+            summary["steps"][step] = time.perf_counter() - start
+            return True
+        except GitCommandError as e:
+            logger.error(f"{repository.repo_path}: {step} failed. {e.stderr}")
+            summary["steps"][step] = None
+            return False
+
+    stats = summary["objects_before"]
+    if full or stats.get("packs", 0) > MAX_PACKS:
+        options = ["-a", "-d", "-l", "-q"]
+        try:
+            # objects of a fork family reference may be read by its members through alternates
+            if git.config("--get", "gc.pruneExpire") == "never":
+                options.append("--keep-unreachable")
+        except GitCommandError:
+            pass
+        run("repack", "repack", *options)
+    elif stats.get("count", 0) > 0:
+        run("repack", "repack", "-d", "-l", "-q")
+    run(
+        "commit-graph",
+        "commit-graph",
+        "write",
+        "--reachable",
+        "--changed-paths",
+        "--no-progress",
+    )
+    # bitmaps need the closure of all objects, which partial clones and alternates lack
+    if not run(
+        "multi-pack-index", "multi-pack-index", "write", "--bitmap", "--no-progress"
+    ):
+        run("multi-pack-index", "multi-pack-index", "write", "--no-progress")
+
+    summary["objects_after"] = count_objects(repository)
+    if timings:
+        summary["after"] = time_listing(repository)
+    repository.close()
+
+    with open(os.path.join(repository.data_folder, MAINTENANCE_FILE), "w") as f:
+        json.dump(summary, f)
+    logger.info(f"maintenance summary of {repository.repo_path}: {summary}")
+    return summary
+
+
+def last_maintenance(url: str, base_folder: str) -> Optional[dict]:
+    """the summary of the last maintenance of a repository, None if it has never been maintained"""
+    path = os.path.join(assemble_repo_folder(url, base_folder), MAINTENANCE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -4,20 +4,48 @@ import logging
 import math
 import os
 import shutil
+import sys
 from functools import cached_property
-from typing import Optional
+from typing import BinaryIO, Iterator, Optional
 from urllib.parse import urljoin, urlparse
 
+import numpy as np
+import psutil
 from git import GitCommandError, GitDB, InvalidGitRepositoryError, Repo
+from git.objects.fun import tree_entries_from_data
+from joblib import Parallel, delayed
 from tqdm import tqdm
 
-from pyradar.utils import CacheDict
+from pyradar.fork_family import ForkFamilies
+from pyradar.index import (
+    BLOB_DTYPE,
+    BlobSet,
+    RepoIndex,
+    RepoIndexWriter,
+    bin_to_hex,
+    hex_to_bin,
+    load_array,
+)
+from pyradar.tree_memo import TreeMemo
+from pyradar.utils import CacheDict, calculate_digests
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 failed_urls = []
 
+# check the resident memory every this many commits during traversal
+MEMORY_CHECK_INTERVAL = 10
+# the caches are halved whenever the resident memory exceeds the budget, down to this length
+MIN_CACHE_LEN = 64
+
+# the object type of a tree entry is determined by the high bits of its file mode
+MODE_TYPES = {0o04: "tree", 0o16: "commit"}
+
+# the number of commit ranges per worker process on the parallel traversal path,
+# more ranges than workers keep the pool busy when some ranges are more expensive
+RANGES_PER_JOB = 4
+
 
 def assemble_repo_folder(url: str, base_folder: str) -> str:
     """Assemble the folder path for a repository based on its remote url.
@@ -46,19 +74,226 @@ def normalize_git_url(url: str):
         return "https://" + url[6:]
 
 
+def memory_usage() -> int:
+    """the resident memory of the current process in MB"""
+    return psutil.Process().memory_info().rss // (1024 * 1024)
+
+
+def list_objects(repo: Repo) -> dict[str, list[str]]:
+    """list all git objects of a repository by their types with `git cat-file --batch-check --batch-all-objects --unordered`"""
+    object_shas = {"commit": [], "tree": [], "blob": [], "tag": []}
+    output = repo.git.cat_file(
+        batch_check=True, batch_all_objects=True, unordered=True
+    ).split("\n")
+
+    for obj in output:
+        if len(obj.split(" ")) < 3:
+            break
+        obj_sha, obj_type, _ = obj.split(" ")
+        if obj_type in ["commit", "tree", "blob", "tag"]:
+            object_shas[obj_type].append(obj_sha)
+    return object_shas
+
+
+def is_partial(repo: Repo) -> bool:
+    """whether a repository is a partial clone, whose missing objects are fetched lazily from the remote"""
+    try:
+        return repo.git.config("--get", "remote.origin.promisor") == "true"
+    except GitCommandError:
+        return False
+
+
+def has_alternates(repo: Repo) -> bool:
+    """whether a repository borrows objects from other object databases, e.g., a fork cloned with `reference`"""
+    return os.path.exists(os.path.join(repo.git_dir, "objects", "info", "alternates"))
+
+
+def list_reachable_objects(repo: Repo) -> dict[str, list[str]]:
+    """list the objects reachable from any ref by their types without reading any blob
+
+    Unlike `list_objects`, objects in the object database that no ref of the repository
+    reaches are left out, e.g., the objects of the upstream in the alternates of a fork,
+    and no blob of a partial clone is fetched.
+    """
+    object_shas = {"commit": [], "tree": [], "blob": [], "tag": []}
+    refs = repo.git.for_each_ref("--format=%(objectname) %(objecttype)").split("\n")
+    tag_shas = {ref.split(" ")[0] for ref in refs if ref.endswith(" tag")}
+    # blobs omitted by the filter are printed as `~<sha>`, commits as `<sha>`,
+    # and trees and tags as `<sha> <path>`
+    proc = repo.git.rev_list(
+        "--all",
+        "--objects",
+        "--filter=blob:none",
+        "--filter-print-omitted",
+        as_process=True,
+    )
+    for line in proc.stdout:
+        line = line.rstrip(b"\n")
+        if line.startswith(b"~"):
+            object_shas["blob"].append(line[1:41].decode())
+        elif len(line) == 40:
+            object_shas["commit"].append(line.decode())
+        else:
+            obj_sha = line[:40].decode()
+            object_shas["tag" if obj_sha in tag_shas else "tree"].append(obj_sha)
+    proc.wait()
+    return object_shas
+
+
+def list_reachable_blobs(repo: Repo) -> list[str]:
+    """list the blobs reachable from any ref without reading them, so that no blob of a partial clone is fetched"""
+    return list_reachable_objects(repo)["blob"]
+
+
+def list_blob_shas(repo: Repo) -> list[str]:
+    """list all blobs of a repository, including the blobs a partial clone has not fetched
+    and excluding the blobs only borrowed from alternate object databases"""
+    if is_partial(repo) or has_alternates(repo):
+        return list_reachable_blobs(repo)
+    return list_objects(repo)["blob"]
+
+
+class ObjectReader:
+    def __init__(self, repo: Repo, memo: Optional[TreeMemo] = None) -> None:
+        """Read git objects through one long-lived `git cat-file --batch` process.
+
+        The process is started lazily by GitPython on the first read and is reused
+        for all subsequent reads until `close` is called.
+
+        Args:
+            repo (Repo): the repository to read objects from
+            memo (Optional[TreeMemo], optional): the persistent tree memo consulted before reading
+                a tree from the repository. Defaults to None.
+        """
+        self.repo = repo
+        self.memo = memo
+
+    def read(self, sha: str) -> tuple[str, bytes]:
+        """read the raw content of a git object
+
+        Args:
+            sha (str): the object sha (or any revision understood by git)
+
+        Raises:
+            ValueError: if the object does not exist
+
+        Returns:
+            tuple[str, bytes]: the object type and the raw object content
+        """
+        _, obj_type, _, data = self.repo.git.get_object_data(sha)
+        return obj_type, data
+
+    def read_tree(self, tree_sha: str) -> list[tuple[str, str, str]]:
+        """list the direct entries of a tree object
+
+        Args:
+            tree_sha (str): the tree sha
+
+        Returns:
+            list[tuple[str, str, str]]: a list of (object type, sha, name) entries
+        """
+        data = self.memo.get(tree_sha) if self.memo else None
+        if data is None:
+            _, data = self.read(tree_sha)
+            if self.memo:
+                self.memo.put(tree_sha, data)
+        return [
+            (MODE_TYPES.get(mode >> 12, "blob"), binsha.hex(), name)
+            for binsha, mode, name in tree_entries_from_data(data)
+        ]
+
+    def read_commit_tree(self, commit_sha: str) -> str:
+        """get the root tree sha of a commit"""
+        _, data = self.read(commit_sha)
+        # the first line of a commit object is always `tree <sha>`
+        return data[5:45].decode()
+
+    def read_blob(self, blob_sha: str) -> bytes:
+        """get the raw content of a blob object"""
+        return self.read(blob_sha)[1]
+
+    def stream_blob(self, blob_sha: str) -> tuple[int, BinaryIO]:
+        """get the size and a stream of the content of a blob object, which must be read to the end
+        before the next object is read"""
+        _, _, size, stream = self.repo.git.stream_object_data(blob_sha)
+        return size, stream
+
+    def close(self):
+        """terminate the `git cat-file --batch` process"""
+        self.repo.git.clear_cache()
+
+
+class TreeNode:
+    """A traversed tree: its direct blobs and references to the nodes of its subtrees.
+
+    A tree is stored once no matter how many commits or parent trees contain it, and the
+    names are interned, so the cache of traversed trees grows with the number of distinct
+    trees rather than with the number of files under them. File paths are only joined when
+    `flatten` is called.
+    """
+
+    __slots__ = ("blobs", "subtrees")
+
+    def __init__(self) -> None:
+        self.blobs: list[tuple[str, str]] = []
+        self.subtrees: list[tuple[str, "TreeNode"]] = []
+
+    def flatten(self, root_path: str = "") -> Iterator[tuple[str, str]]:
+        """lazily list the (sha, filename) pairs of all blobs under the tree"""
+        stack = [(root_path, self)]
+        while stack:
+            path, node = stack.pop()
+            for sha, name in node.blobs:
+                yield sha, os.path.join(path, name)
+            for name, subtree in reversed(node.subtrees):
+                stack.append((os.path.join(path, name), subtree))
+
+
 class Repository:
     def __init__(
         self,
         url: str,
         base_folder: str,
-        chunk_size: int = 1000,
+        max_edges: int = 2000000,
+        memory_budget: Optional[int] = None,
         tree_cache_size: int = 30000,
+        checkpoint_interval: int = 64,
+        fast_blob_set: bool = False,
+        tree_memo: bool = False,
+        n_jobs: int = 1,
+        parallel_threshold: int = 10000,
+        share_forks: bool = False,
+        blobless: bool = False,
     ) -> None:
         """Create a wrapped `gitpython.Repo` object.
 
         Args:
             url (str): the remote repository url
             base_folder (str): the folder that stores repository and relevant data.
+            max_edges (int, optional): the number of delta-encoded (blob, filename) records `traverse_all`
+                appends before committing the index to disk. Defaults to 2000000.
+            memory_budget (Optional[int], optional): the resident memory (in MB) above which `traverse_all`
+                commits the index and rebuilds the tree and snapshot caches with half their capacity.
+                Defaults to None (no limit).
+            checkpoint_interval (int, optional): the maximum number of delta-encoded snapshots between
+                two full snapshots in the index. Defaults to 64.
+            fast_blob_set (bool, optional): build `blob_set` from the object database (and the object
+                databases of declared submodules) instead of traversing all commits. The object database
+                also has unreachable objects and the whole history of every submodule, so the set differs
+                from the traversed one that the shipped models were trained on. Defaults to False.
+            tree_memo (bool, optional): read trees through the tree memo `<base_folder>/tree_memo.sqlite`
+                shared by all repositories in `base_folder` (see `TreeMemo`). Reading a tree from a local
+                object database is about as fast, so it is only worth it when trees are expensive to read.
+                Defaults to False.
+            n_jobs (int, optional): the number of worker processes `traverse_all` uses to list the
+                snapshots of a repository. Defaults to 1.
+            parallel_threshold (int, optional): the minimum number of commits to traverse for which
+                `traverse_all` switches to the parallel path when `n_jobs` > 1. Defaults to 10000.
+            share_forks (bool, optional): when cloning, share the objects of a fork family already on disk
+                through git alternates (see `ForkFamilies`). Defaults to False.
+            blobless (bool, optional): clone without blobs (`--filter=blob:none`) and without checkout.
+                Traversal only needs commits and trees, and the few blobs that are read, such as
+                .gitmodules, are fetched on demand. Defaults to False.
         """
         self.url = url.strip("/")
         # if self.url.startswith("git@"):
@@ -66,10 +301,28 @@ class Repository:
         self.base_folder = base_folder
         self.data_folder = assemble_repo_folder(url, base_folder)
         self.repo_path = os.path.join(self.data_folder, "repo")
+        self.index_folder = os.path.join(self.data_folder, "index")
+        self.share_forks = share_forks
+        self.blobless = blobless
         self.repo = self.safe_open(self.repo_path, self.url)
+        self.memo = (
+            TreeMemo(os.path.join(base_folder, "tree_memo.sqlite"))
+            if tree_memo
+            else None
+        )
+        self.reader = ObjectReader(self.repo, self.memo) if self.repo else None
+        # pooled object readers of submodule repositories, keyed by url
+        self.submodule_readers: dict[str, Optional[ObjectReader]] = {}
         self.submodule_flag = True
-        self.chunk_size = chunk_size
+        self.max_edges = max_edges
+        self.memory_budget = memory_budget
         self.tree_cache_size = tree_cache_size
+        self.checkpoint_interval = checkpoint_interval
+        self.fast_blob_set = fast_blob_set
+        self.tree_memo = tree_memo
+        self.n_jobs = n_jobs
+        self.parallel_threshold = parallel_threshold
+        self.tree_cache = CacheDict(cache_len=self.tree_cache_size)
 
     # @staticmethod
     def safe_open(self, repo_path: str, url: str) -> Optional[Repo]:
@@ -85,8 +338,8 @@ class Repository:
         Returns:
             Optional[Repo]: the git.Repo object
         """
-        # We only consider GitHub, GitLab, Bitbucket repositories.
-        if not any(
+        # We only consider GitHub, GitLab, Bitbucket repositories, and local ones for testing.
+        if not url.startswith("file://") and not any(
             [loc in url for loc in ["github.com", "gitlab.com", "bitbucket.org"]]
         ):
             return None
@@ -107,8 +360,18 @@ class Repository:
                 if len(segments) != 3:
                     return None
                 url = f"git@{segments[0]}:{segments[1]}/{segments[2]}"
+            options = {}
+            if self.blobless:
+                options = {"filter": "blob:none", "no_checkout": True}
             try:
-                repo = Repo.clone_from(url, repo_path, odbt=GitDB)
+                if self.share_forks:
+                    families = ForkFamilies(
+                        os.path.join(self.base_folder, "fork_families.sqlite")
+                    )
+                    repo = families.clone(url, repo_path, **options)
+                    families.close()
+                else:
+                    repo = Repo.clone_from(url, repo_path, odbt=GitDB, **options)
                 logger.info(f"Clone repository from {url} to {repo_path} successfully")
             except GitCommandError as e:
                 error_msg = e.stderr
@@ -125,21 +388,19 @@ class Repository:
 
     @cached_property
     def object_shas(self) -> dict[str, list[str]]:
-        """use the command `git cat-file --batch-check --batch-all-objects --unordered` to list all git objects"""
+        """use the command `git cat-file --batch-check --batch-all-objects --unordered` to list all git objects
+
+        The alternates of a fork (see `share_forks`) hold the objects of the whole fork family,
+        so the objects of a repository with alternates are listed by reachability instead.
+        """
         logger.info("start listing all git objects")
         object_shas = {"commit": [], "tree": [], "blob": [], "tag": []}
         if self.repo:
             try:
-                output = self.repo.git.cat_file(
-                    batch_check=True, batch_all_objects=True, unordered=True
-                ).split("\n")
-
-                for obj in output:
-                    if len(obj.split(" ")) < 3:
-                        break
-                    obj_sha, obj_type, _ = obj.split(" ")
-                    if obj_type in ["commit", "tree", "blob", "tag"]:
-                        object_shas[obj_type].append(obj_sha)
+                if has_alternates(self.repo):
+                    object_shas = list_reachable_objects(self.repo)
+                else:
+                    object_shas = list_objects(self.repo)
             except Exception as e:
                 logger.error(f"Object Shas error of {self.repo_path}: {e}")
         logger.info("finish listing all git objects")
@@ -151,20 +412,103 @@ class Repository:
         return self.object_shas["tree"]
 
     @cached_property
-    def commit_shas(self) -> list[tuple[str, int]]:
-        """a list of all commit object shas"""
+    def commit_log(self) -> list[tuple[str, int, list[str]]]:
+        """(commit sha, authored timestamp, parent shas) of all commits reachable from any ref.
+
+        The commits are streamed from a single `git log --all` invocation in topological order,
+        i.e., parents always come before their children.
+        """
+        logger.info("start listing all commits")
         commits = []
-        for commit in self.object_shas["commit"]:
-            ts = self.repo.commit(commit).authored_date
-            commits.append((commit, ts))
+        if self.repo:
+            try:
+                proc = self.repo.git.log(
+                    "--all",
+                    "--topo-order",
+                    "--reverse",
+                    "--no-color",
+                    "--format=%H %at %P",
+                    as_process=True,
+                )
+                for line in proc.stdout:
+                    sha, ts, *parents = line.decode().split()
+                    commits.append((sha, int(ts), parents))
+                proc.wait()
+            except Exception as e:
+                logger.error(f"Commit log error of {self.repo_path}: {e}")
+        logger.info("finish listing all commits")
+        return commits
+
+    @cached_property
+    def commit_shas(self) -> list[tuple[str, int]]:
+        """a list of all commit shas with their authored timestamps, sorted by the timestamps"""
+        commits = [(sha, ts) for sha, ts, _ in self.commit_log]
         commits.sort(key=lambda x: x[1])
         return commits
 
+    @cached_property
+    def commit_parents(self) -> dict[str, list[str]]:
+        """the parent shas of each commit"""
+        return {sha: parents for sha, _, parents in self.commit_log}
+
     @cached_property
     def tag_shas(self) -> list[str]:
         """a list of tag object names (e.g., v0.1.0) with the commit shas they point to"""
         return [tag.name for tag in self.repo.tags]
 
+    @cached_property
+    def tag_commits(self) -> dict[str, str]:
+        """the commit sha each tag points to, annotated tags are peeled to their commits"""
+        tags = {}
+        if not self.repo:
+            return tags
+        try:
+            output = self.repo.git.for_each_ref(
+                "refs/tags",
+                # `refname:short` is `tags/<name>` when a branch has the same name
+                format="%(refname:lstrip=2) %(objecttype) %(objectname) %(*objecttype) %(*objectname)",
+            )
+        except GitCommandError as e:
+            logger.error(f"Tag listing error of {self.repo_path}: {e.stderr}")
+            return tags
+        for line in output.split("\n"):
+            fields = line.split(" ")
+            if len(fields) != 5:
+                continue
+            name, obj_type, sha, peeled_type, peeled_sha = fields
+            if peeled_type:
+                obj_type, sha = peeled_type, peeled_sha
+            # tags of trees or blobs do not anchor a release
+            if obj_type == "commit":
+                tags[name] = sha
+        return tags
+
+    def tag_blob_set(self, tag: str, ancestors: int = 0) -> Optional[BlobSet]:
+        """the blobs of the commit a tag points to, without traversing the rest of the history
+
+        Args:
+            tag (str): the tag name
+            ancestors (int, optional): also include the blobs of this many nearest ancestors
+                of the tagged commit. Defaults to 0.
+
+        Returns:
+            Optional[BlobSet]: the blob set, None if the tag does not point to a commit
+        """
+        commit = self.tag_commits.get(tag)
+        if commit is None:
+            return None
+        commits = [commit]
+        if ancestors > 0:
+            commits = self.repo.git.rev_list(commit, max_count=ancestors + 1).split()
+        blobs = set()
+        for commit_sha in commits:
+            blobs.update(sha for sha, _ in self.snapshot(commit_sha))
+        return BlobSet.from_hex(blobs)
+
+    def tag_blob_sets(self, ancestors: int = 0) -> dict[str, BlobSet]:
+        """the blob set of every tag (see `tag_blob_set`), sharing the tree cache across tags"""
+        return {tag: self.tag_blob_set(tag, ancestors) for tag in self.tag_commits}
+
     @staticmethod
     def parse_gitmodules(content: str, base_url: str) -> dict[str, str]:
         """parse the .gitmodules file and return a dict of submodule paths and corresponding urls
@@ -186,52 +530,70 @@ class Repository:
             pass
         return sms
 
+    def submodule_reader(self, url: str) -> Optional[ObjectReader]:
+        """get the pooled object reader of a submodule repository, opening (or cloning) it on first use
+
+        Args:
+            url (str): the normalized url of the submodule repository
+
+        Returns:
+            Optional[ObjectReader]: the object reader, None if the repository cannot be opened
+        """
+        if url not in self.submodule_readers:
+            repo_path = os.path.join(
+                assemble_repo_folder(url, self.base_folder), "repo"
+            )
+            tmp_repo = self.safe_open(repo_path, url)
+            self.submodule_readers[url] = (
+                ObjectReader(tmp_repo, self.memo) if tmp_repo else None
+            )
+        return self.submodule_readers[url]
+
     def traverse(
         self,
         tree_hexsha: str,
-        repo: Repo,
+        reader: ObjectReader,
         root_path: str = "",
         sms: dict = {}
         # self, root_tree: git.Tree, root_path="", sms: dict = {}
-    ) -> list[tuple[str, str]]:
-        """traverse the tree object and return a list of (filename, sha) pairs
+    ) -> "TreeNode":
+        """traverse the tree object and return its structure as a `TreeNode`
 
         Args:
-            root_tree (git.Tree): the root tree object to traverse
+            tree_hexsha (str): the sha of the root tree object to traverse
+            reader (ObjectReader): the object reader of the repository that contains the tree
             root_path (str, optional): the root path of the tree. Defaults to "".
-            base_folder (str, optional): the folder that stores repository and relevant data. Defaults to None.
             sms (str): a dict of submodules with submodule path and url.
 
         Returns:
-            list[tuple[str, str]]: a list containing the filenames and corresponding hex shas.
+            TreeNode: the direct blobs of the tree and the nodes of its subtrees and submodules,
+                call `TreeNode.flatten` to list the (sha, filename) pairs.
         """
 
         # if the tree is already traversed, return the cached result
-        files = self.tree_cache.get(tree_hexsha, [])
-        if files:
+        if tree_hexsha in self.tree_cache:
             # logger.info(f"tree {tree_hexsha} is already traversed")
-            return files
+            return self.tree_cache[tree_hexsha]
 
-        logger.info(f"traversing tree {tree_hexsha} in repository {repo}")
+        logger.info(f"traversing tree {tree_hexsha} in repository {reader.repo}")
         # logger.error(f"{tree_hexsha}")
+        node = TreeNode()
 
         # # unchecked stores the tree objects that are not traversed yet
         # unchecked = [(root_tree, "")]
         # while len(unchecked) > 0:
         #     tree, path = unchecked.pop()
-        for item in repo.git.cat_file("-p", tree_hexsha).split("\n"):
-            if item == "":
-                continue
-            _, obj_type, sha_name = item.split(" ", 2)
-            sha, name = sha_name.split("\t", 1)
-
+        for obj_type, sha, name in reader.read_tree(tree_hexsha):
+            name = sys.intern(name)
             # if the object is a blob, add it to the list
             if obj_type == "blob":
-                files.append((sha, os.path.join(root_path, name)))
+                node.blobs.append((sha, name))
 
                 # only consider .gitmodules file in the root folder
                 if (not sms) and (name == ".gitmodules"):
-                    gitmodules_content = repo.git.cat_file("-p", sha)
+                    gitmodules_content = reader.read_blob(sha).decode(
+                        "utf-8", errors="replace"
+                    )
                     # print(tree_hexsha)
                     # print(gitmodules_content)
                     sms = Repository.parse_gitmodules(gitmodules_content, self.url)
@@ -243,10 +605,8 @@ class Repository:
             # if the object is a tree, traverse it
             elif obj_type == "tree":
                 # print(sha)
-                tree_files = self.traverse(
-                    sha, repo, os.path.join(root_path, name), sms
-                )
-                files.extend(tree_files)
+                subtree = self.traverse(sha, reader, os.path.join(root_path, name), sms)
+                node.subtrees.append((name, subtree))
 
             # if the object is a commit (i.e., submodule), traverse its root tree.
             elif obj_type == "commit":
@@ -268,22 +628,15 @@ class Repository:
                     if not url:
                         continue
                     # print(url)
-                    repo_path = os.path.join(
-                        assemble_repo_folder(url, self.base_folder), "repo"
-                    )
                     if url not in failed_urls:
-                        tmp_repo = self.safe_open(repo_path, url)
-                        if tmp_repo:
+                        sm_reader = self.submodule_reader(url)
+                        if sm_reader:
                             try:
-                                tree_hash = (
-                                    tmp_repo.git.cat_file("-p", sha)
-                                    .split("\n")[0]
-                                    .split(" ")[1]
-                                )
-                                sm_files = self.traverse(
-                                    tree_hash, tmp_repo, sm_path, {}
+                                tree_hash = sm_reader.read_commit_tree(sha)
+                                sm_node = self.traverse(
+                                    tree_hash, sm_reader, sm_path, {}
                                 )
-                                files.extend(sm_files)
+                                node.subtrees.append((name, sm_node))
                             except Exception as e:
                                 logger.error(
                                     f"Submodule error of {self.repo_path}: {sha} not in submodule {sm_path}: {url}"
@@ -291,9 +644,8 @@ class Repository:
                         else:
                             failed_urls.append(url)
 
-        # tmp = [(sha, os.path.join(root_path, path)) for sha, path in files]
-        self.tree_cache[tree_hexsha] = files
-        return files
+        self.tree_cache[tree_hexsha] = node
+        return node
 
     def snapshot(self, commit_sha: str) -> list[tuple[str, str]]:
         """get the folder structure of a commit
@@ -304,122 +656,502 @@ class Repository:
         Returns:
             list[tuple[str, str]]: a list containing the filenames and corresponding hex shas.
         """
-        tree_hash = (
-            self.repo.git.cat_file("-p", commit_sha).split("\n")[0].split(" ")[1]
-        )
-        return self.traverse(
+        tree_hash = self.reader.read_commit_tree(commit_sha)
+        node = self.traverse(
             tree_hexsha=tree_hash,
-            repo=self.repo,
+            reader=self.reader,
             root_path="",
             sms={},
         )
+        return list(node.flatten())
 
-    def traverse_all(self, disable_pbar: bool = True):
+    def traverse_all(
+        self, disable_pbar: bool = True, until: Optional[int] = None
+    ) -> dict:
         """
-        traverse all commits and save the mapping and blob information to json files
+        traverse all commits and save the mapping and blob information to a columnar index (see `RepoIndex`).
+        If the index already exists, only commits that are not in the index yet are traversed and appended.
+        With `until`, only the commits authored up to that timestamp are traversed, and a later call with
+        a wider window (or without `until`) appends the remaining commits.
+
+        Ids are assigned while commits are traversed, and the index is committed to disk whenever
+        `max_edges` delta records are pending, so an interrupted traversal resumes from the last
+        committed commit. Whenever the resident memory exceeds `memory_budget`, the index is committed as well
+        and the caches shrink.
+
+        Args:
+            disable_pbar (bool, optional): disable the progress bar. Defaults to True.
+            until (Optional[int], optional): the latest authored timestamp of the commits to traverse.
+                Defaults to None (all commits).
+
+        Returns:
+            dict: the traversal summary, i.e., the number of traversed commits, the number of commits
+                and edges in each flushed chunk, and the peak resident memory (in MB)
         """
-        snapshot_path = os.path.join(self.data_folder, "snapshot-{}.json")
-        index_path = os.path.join(self.data_folder, "index.json")
-        # b2c_path = os.path.join(self.data_folder, "bid2cid.json")
-        num_chunks = math.ceil(len(self.commit_shas) / self.chunk_size)
-        # print(len(self.commit_shas), self.chunk_size, num_chunks)
+        indexed = set()
+        covered = -1
+        if RepoIndex.exists(self.index_folder):
+            index = RepoIndex(self.index_folder)
+            indexed = set(index.commit_ids)
+            covered = index.until
+        commits = [
+            (commit_sha, ts)
+            for commit_sha, ts in self.commit_shas
+            if commit_sha not in indexed and (until is None or ts <= until)
+        ]
+        # the window covered by the index once the traversal completes, i.e., up to the
+        # earliest commit that is left out, which may be older than the previous window
+        # when fetched commits were authored earlier
+        left_out = [
+            ts
+            for commit_sha, ts in self.commit_shas
+            if commit_sha not in indexed and until is not None and ts > until
+        ]
+        window = min(left_out) - 1 if left_out else None
+
+        summary = {
+            "num_commits": len(commits),
+            "chunk_commits": [],
+            "chunk_edges": [],
+            "peak_memory": memory_usage(),
+        }
+        self.traversal_summary = summary
 
         # already traversed completely
-        if os.path.exists(snapshot_path.format(num_chunks - 1)):
-            return
+        if not commits and window == covered:
+            return summary
+        logger.info(
+            f"{len(commits)} new commits to traverse, {len(indexed)} commits already indexed"
+        )
 
         # LRU cache tree traverse results to speed up
         self.tree_cache = CacheDict(cache_len=self.tree_cache_size)
+        if self.repo and is_partial(self.repo):
+            # the .gitmodules blobs are read while traversing, fetch them in one request
+            self.prefetch_blobs(self.gitmodules_blobs)
+        parallel = self.n_jobs > 1 and len(commits) >= self.parallel_threshold
 
-        blobs = set()
-        filenames = set()
-        edges = {}
+        # for space efficiency, the blob shas, commit shas, and filenames are mapped to ids
+        # as soon as they are seen, and each snapshot is delta-encoded against the first
+        # parent of the commit, so no snapshot is kept after it has been appended.
+        writer = RepoIndexWriter(
+            self.index_folder, checkpoint_interval=self.checkpoint_interval
+        )
+        num_commits = 0
 
-        chunk_id = 0
+        def commit():
+            nonlocal num_commits
+            summary["chunk_commits"].append(num_commits)
+            summary["chunk_edges"].append(writer.num_pending)
+            writer.commit()
+            num_commits = 0
 
-        for i, commit_ts in enumerate(
-            tqdm(self.commit_shas, ascii=" >=", unit="commit", disable=disable_pbar),
-            start=1,
-        ):
-            # for i, commit_ts in enumerate(self.commit_shas, start=1):
-            commit = commit_ts[0]
-            logger.info(f"start listing commit {commit}")
-
-            # print(commit)
-            edges[commit] = self.snapshot(commit)
-            for blob_sha, blob_name in edges[commit]:
-                blobs.add(blob_sha)
-                filenames.add(blob_name)
-
-            # dump edges to snapshot.json file every `self.chunk_size` commits in case of memory explosion :(
-            if i % self.chunk_size == 0:
-                with open(snapshot_path.format(chunk_id), "w") as f:
-                    json.dump(edges, f)
-                chunk_id += 1
-                edges = {}
-            # logger.info(f"finish listing commit {commit}")
-
-        # dump the remaining edges if any
-        if len(edges) > 0:
-            with open(snapshot_path.format(chunk_id), "w") as f:
-                json.dump(edges, f)
-            chunk_id += 1
-            edges = {}
+        def append_snapshots() -> Iterator[int]:
+            for commit_sha, ts in commits:
+                parents = self.commit_parents.get(commit_sha, [])
+                writer.append_commit(
+                    commit_sha,
+                    ts,
+                    self.snapshot(commit_sha),
+                    parents[0] if parents else None,
+                )
+                yield 1
+
+        def append_partial_indexes() -> Iterator[int]:
+            # workers index ranges of commits, and only the partial indexes are merged here
+            for partial in self.parallel_indexes(commits):
+                writer.append_index(partial)
+                yield partial.meta["num_commits"]
+
+        pbar = tqdm(
+            total=len(commits), ascii=" >=", unit="commit", disable=disable_pbar
+        )
+        steps = append_partial_indexes() if parallel else append_snapshots()
+        for i, appended in enumerate(steps, start=1):
+            pbar.update(appended)
+            num_commits += appended
+
+            # make the progress durable when the delta records exceed the budget, instead of
+            # every fixed number of commits, whose size varies wildly across repositories
+            if writer.num_pending >= self.max_edges:
+                commit()
+            # the peak is reported whether or not there is a budget
+            if parallel or i % MEMORY_CHECK_INTERVAL == 0:
+                rss = memory_usage()
+                summary["peak_memory"] = max(summary["peak_memory"], rss)
+                if self.memory_budget and rss >= self.memory_budget:
+                    if num_commits > 0:
+                        commit()
+                    # the caches are the big consumers, rebuild them from scratch, and smaller
+                    # each time the budget is exceeded, as freed memory is not always returned to the OS
+                    tree_cache_len = max(self.tree_cache.cache_len // 2, MIN_CACHE_LEN)
+                    snapshot_cache_len = max(
+                        writer.snapshot_cache.cache_len // 2, MIN_CACHE_LEN
+                    )
+                    self.tree_cache = CacheDict(cache_len=tree_cache_len)
+                    writer.snapshot_cache = CacheDict(cache_len=snapshot_cache_len)
+                    logger.info(
+                        f"{rss} MB exceeds the budget, shrink the caches to {tree_cache_len} trees"
+                        f" and {snapshot_cache_len} snapshots"
+                    )
+
+        pbar.close()
+        if num_commits > 0:
+            summary["chunk_commits"].append(num_commits)
+            summary["chunk_edges"].append(writer.num_pending)
+        writer.meta["until"] = window
+        writer.close()
+        summary["peak_memory"] = max(summary["peak_memory"], memory_usage())
 
         # collect tree_cache in case of
-        self.tree_cache = CacheDict()
-        # for space efficiency, we map the blob shas, commit shas, and filenames to index
-        # and replace the original shas with the indices in the snapshots
-        logger.info(f"start dumping to index.json")
-        blobs = list(blobs)
-        blobs.sort()
-        indices = {}
-        indices["blob"] = {sha: i for i, sha in enumerate(blobs)}
-        indices["commit"] = {
-            sha: [i, ts] for i, (sha, ts) in enumerate(self.commit_shas)
-        }
-        filenames = list(filenames)
-        filenames.sort()
-        indices["filename"] = {fn: i for i, fn in enumerate(filenames)}
-        with open(index_path, "w") as outf:
-            json.dump(indices, outf, indent=4)
-        logger.info(f"finish dumping to index.json")
-
-        logger.info("start dumping to snapshot.json")
-        for i in range(chunk_id):
-            filepath = snapshot_path.format(i)
-            edges = json.load(open(filepath))
-            indexed_edges = {}
-            for c, b_fn in edges.items():
-                cid = indices["commit"][c][0]
-                indexed_edges[cid] = [
-                    [indices["blob"][b], indices["filename"][fn]] for b, fn in b_fn
+        self.tree_cache = CacheDict(cache_len=self.tree_cache_size)
+        if self.memo:
+            self.memo.flush()
+        for attr in ("index", "blob_shas", "file_names"):
+            self.__dict__.pop(attr, None)
+        if not self.fast_blob_set:
+            self.__dict__.pop("blob_set", None)
+        logger.info(f"traversal summary of {self.repo_path}: {summary}")
+        return summary
+
+    def parallel_indexes(self, commits: list[tuple[str, int]]) -> Iterator[RepoIndex]:
+        """index ranges of commits in `n_jobs` worker processes sharing the tree memo
+
+        Each worker traverses its range and writes a partial index to `partial-<i>` in the data folder
+        (see `index_range`), so snapshots never leave the workers. The partial indexes are yielded in
+        the original commit order, to be merged with `RepoIndexWriter.append_index`, and removed afterwards.
+
+        Args:
+            commits (list[tuple[str, int]]): the (commit sha, timestamp) pairs to index
+
+        Yields:
+            Iterator[RepoIndex]: the partial index of each range
+        """
+        # make the trees read so far visible to the workers
+        if self.memo:
+            self.memo.flush()
+        size = math.ceil(len(commits) / (self.n_jobs * RANGES_PER_JOB))
+        commits = [
+            (commit_sha, ts, (self.commit_parents.get(commit_sha) or [None])[0])
+            for commit_sha, ts in commits
+        ]
+        ranges = [commits[i : i + size] for i in range(0, len(commits), size)]
+        partial_folder = os.path.join(self.data_folder, "partial-{}")
+        logger.info(
+            f"index {len(commits)} commits in {len(ranges)} ranges with {self.n_jobs} processes"
+        )
+        # one batch of ranges at a time, so that at most `n_jobs` partial indexes are on disk
+        for start in range(0, len(ranges), self.n_jobs):
+            batch = range(start, min(start + self.n_jobs, len(ranges)))
+            Parallel(n_jobs=self.n_jobs, backend="multiprocessing")(
+                delayed(index_range)(
+                    self.url,
+                    self.base_folder,
+                    ranges[i],
+                    partial_folder.format(i),
+                    self.tree_cache_size,
+                    self.tree_memo,
+                    self.checkpoint_interval,
+                )
+                for i in batch
+            )
+            for i in batch:
+                yield RepoIndex(partial_folder.format(i))
+                shutil.rmtree(partial_folder.format(i))
+
+    def update(
+        self, disable_pbar: bool = True, maintain: bool = False
+    ) -> Optional[dict]:
+        """fetch the remote repository and append the new commits to the index, return the traversal summary
+
+        With `maintain`, the fetched objects are repacked and the commit-graph is rewritten before
+        the new commits are traversed (see `pyradar.maintenance.maintain`).
+        """
+        if not self.repo:
+            return
+        try:
+            self.repo.git.fetch("--all", "--tags", "--prune")
+        except GitCommandError as e:
+            logger.error(f"{self.repo_path}: Failed to fetch repository. {e.stderr}")
+            return
+        if maintain:
+            from pyradar.maintenance import maintain as maintain_repository
+
+            maintain_repository(self.url, self.base_folder, timings=False)
+        # drop everything derived from the objects before the fetch
+        for attr in (
+            "object_shas",
+            "tree_shas",
+            "commit_log",
+            "commit_shas",
+            "commit_parents",
+            "tag_shas",
+            "tag_commits",
+            "index",
+            "gitmodules_blobs",
+            "declared_submodules",
+            "object_blob_set",
+            "blob_set",
+            "blob_shas",
+            "file_names",
+            "blob_variants",
+        ):
+            self.__dict__.pop(attr, None)
+        return self.traverse_all(disable_pbar=disable_pbar)
+
+    @cached_property
+    def index(self) -> RepoIndex:
+        """the memory-mapped index of the repository, traverse all commits that are not indexed yet"""
+        if not (
+            RepoIndex.exists(self.index_folder)
+            and RepoIndex(self.index_folder).covers(None)
+        ):
+            logger.info(f"index not complete, start traversing all commits")
+            self.traverse_all()
+        logger.info(f"loading index from {self.index_folder}")
+        return RepoIndex(self.index_folder)
+
+    def window_index(self, until: int) -> RepoIndex:
+        """the index of the repository covering at least the commits authored up to `until`,
+        only the missing part of the window is traversed if needed"""
+        if not (
+            RepoIndex.exists(self.index_folder)
+            and RepoIndex(self.index_folder).covers(until)
+        ):
+            logger.info(f"index does not cover {until}, start traversing commits")
+            self.traverse_all(until=until)
+        return RepoIndex(self.index_folder)
+
+    def window_blob_set(self, until: int) -> BlobSet:
+        """the blobs of the commits authored up to `until`"""
+        return self.window_index(until).blob_set_until(until)
+
+    def blob_history(
+        self, blob_shas: list[str]
+    ) -> list[Optional[tuple[str, int, list[str]]]]:
+        """the earliest commit, its authored timestamp and all paths of each blob (see `RepoIndex.blob_history`)"""
+        return self.index.blob_history(blob_shas)
+
+    def locate_release(
+        self, file_shas: list[tuple[str, str]], top: int = 1
+    ) -> list[tuple[str, int, list[list[str]]]]:
+        """find the commits a distribution was most likely built from
+
+        Commits are ranked by the exact number of distribution blobs they contain (see
+        `RepoIndex.contained_blobs`), so a distribution that is a small subset of a large snapshot
+        is still located, and only the snapshots of the best `top` commits are materialized.
+
+        Args:
+            file_shas (list[tuple[str, str]]): the (filename, blob sha) pairs of the distribution,
+                as returned by `DistReader.file_shas`
+            top (int, optional): the number of commits to return. Defaults to 1.
+
+        Returns:
+            list[tuple[str, int, list[list[str]]]]: the commit sha, the number of distribution files
+                found in the commit, and the [filename, blob sha] of the other (phantom) files, ordered
+                by the overlap and then by the number of blobs in the commit
+        """
+        index = self.index
+        if not file_shas or index.meta["num_commits"] == 0:
+            return []
+        fshas = [fsha for _, fsha in file_shas]
+        counts = index.contained_blobs(fshas)
+        # the most contained blobs first, then the smallest snapshot, then the oldest commit
+        best = np.lexsort((index.commits["num_blobs"], -counts))[:top]
+        ids = index.blob_ids(fshas)
+
+        res = []
+        for cid in best.tolist():
+            found = np.isin(ids, index.snapshot(cid)["blob"])
+            commit_sha = bin_to_hex(index.commits["sha"][cid : cid + 1])[0]
+            phantoms = [
+                [fname, fsha]
+                for (fname, fsha), present in zip(file_shas, found)
+                if not present
+            ]
+            res.append((commit_sha, int(found.sum()), phantoms))
+        return res
+
+    @cached_property
+    def gitmodules_blobs(self) -> list[str]:
+        """the blob shas of all versions of the root .gitmodules file"""
+        blob_shas = []
+        if not self.repo:
+            return blob_shas
+        try:
+            # every change of .gitmodules in the history, as `:<modes> <old blob> <new blob> <status>\t<path>`
+            output = self.repo.git.log(
+                "--all", "--format=", "--raw", "--no-abbrev", "--", ".gitmodules"
+            )
+        except GitCommandError as e:
+            logger.error(f"Gitmodules error of {self.repo_path}: {e.stderr}")
+            return blob_shas
+        for line in output.split("\n"):
+            if not line.startswith(":"):
+                continue
+            blob_sha = line.split("\t")[0].split(" ")[3]
+            if set(blob_sha) != {"0"}:
+                blob_shas.append(blob_sha)
+        return list(dict.fromkeys(blob_shas))
+
+    def prefetch_blobs(self, blob_shas: list[str]):
+        """fetch blobs missing from a partial clone in one request, instead of one lazy fetch per blob"""
+        if not blob_shas or not self.repo or not is_partial(self.repo):
+            return
+        try:
+            # the same fetch git runs for a single missing object
+            self.repo.git.execute(
+                [
+                    "git",
+                    "-c",
+                    "fetch.negotiationAlgorithm=noop",
+                    "fetch",
+                    "--quiet",
+                    "--no-tags",
+                    "--no-write-fetch-head",
+                    "--recurse-submodules=no",
+                    "--filter=blob:none",
+                    "origin",
+                    *blob_shas,
                 ]
-            with open(filepath, "w") as f:
-                json.dump(indexed_edges, f)
-        logger.info("finish dumping to snapshot.json")
+            )
+        except GitCommandError as e:
+            # missing blobs are still fetched lazily when they are read
+            logger.error(f"{self.repo_path}: Failed to prefetch blobs. {e.stderr}")
+
+    @cached_property
+    def declared_submodules(self) -> dict[str, str]:
+        """submodule paths and urls declared in any version of the root .gitmodules file"""
+        sms = {}
+        self.prefetch_blobs(self.gitmodules_blobs)
+        for blob_sha in self.gitmodules_blobs:
+            content = self.read_blob_content(blob_sha)
+            sms.update(Repository.parse_gitmodules(content, self.url))
+        return sms
+
+    @cached_property
+    def object_blob_set(self) -> BlobSet:
+        """all blobs in the object database (reachable ones if borrowed from alternates or not fetched),
+        unioned with the blobs of all declared submodules"""
+        if self.repo and is_partial(self.repo):
+            blob_set = BlobSet.from_hex(list_reachable_blobs(self.repo))
+        else:
+            blob_set = BlobSet.from_hex(self.object_shas["blob"])
+        for url in set(self.declared_submodules.values()):
+            url = normalize_git_url(url)
+            if (not url) or (url in failed_urls):
+                continue
+            sm_reader = self.submodule_reader(url)
+            if not sm_reader:
+                failed_urls.append(url)
+                continue
+            try:
+                sm_blobs = list_blob_shas(sm_reader.repo)
+            except Exception as e:
+                logger.error(f"Object Shas error of submodule {url}: {e}")
+                continue
+            blob_set = blob_set.union(BlobSet.from_hex(sm_blobs))
+        return blob_set
+
+    @cached_property
+    def blob_set(self) -> BlobSet:
+        """all blob shas as a sorted binary array with batched membership queries.
+
+        With `fast_blob_set`, the set is built straight from the object databases and
+        no commit is traversed. Otherwise, it is the memory-mapped blob array of the index.
+        """
+        if self.fast_blob_set:
+            return self.object_blob_set
+        return self.index.blob_set
+
+    @cached_property
+    def blob_variants(self) -> Optional[tuple[BlobSet, BlobSet]]:
+        """the LF-normalized git blob shas and the whitespace fingerprints of the indexed blobs
+
+        Both are computed from the blob contents in one pass (see `calculate_digests`) and stored
+        in the index folder: `lf_blobs.bin` only holds the shas of blobs with CR newlines, as the
+        others are their own LF-normalized blobs, and `ws_fingerprints.bin` holds the fingerprints
+        of all blobs. Blob ids are append-only, so only the blobs indexed since the last call are read.
+
+        The first call after a traversal reads every new blob, so precompute the variants
+        (e.g., with `list_blobs --variants`) before they are looked up by validators.
+
+        Returns:
+            Optional[tuple[BlobSet, BlobSet]]: the LF-normalized shas and the whitespace fingerprints,
+                None for partial clones, whose blob contents are not on disk
+        """
+        empty = BlobSet(np.empty(0, dtype=BLOB_DTYPE))
+        if not self.repo:
+            return empty, empty
+        if is_partial(self.repo):
+            logger.error(f"{self.repo_path}: no blob variants of a partial clone")
+            return None
+        index = self.index
+        meta_path = os.path.join(self.index_folder, "variants.json")
+        lf_path = os.path.join(self.index_folder, "lf_blobs.bin")
+        ws_path = os.path.join(self.index_folder, "ws_fingerprints.bin")
+        start = 0
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                variants_meta = json.load(f)
+            # the blobs of a rebuilt index are all read again, as their ids may have changed
+            if variants_meta.get("generation") == index.generation:
+                start = variants_meta["num_blobs"]
+        # older indexes have no generation, but a rebuilt one may be smaller
+        if start > len(index.blobs):
+            start = 0
+
+        if start < len(index.blobs):
+            # the index also has the blobs of submodules
+            readers = [self.reader]
+            for url in set(self.declared_submodules.values()):
+                url = normalize_git_url(url)
+                if url and url not in failed_urls and self.submodule_reader(url):
+                    readers.append(self.submodule_reader(url))
+            lf_shas, fingerprints = [], []
+            for blob_sha in bin_to_hex(index.blobs[start:]):
+                for reader in readers:
+                    try:
+                        size, stream = reader.stream_blob(blob_sha)
+                        break
+                    except ValueError:
+                        continue
+                else:
+                    logger.error(f"{self.repo_path}: failed to read blob {blob_sha}")
+                    continue
+                sha, lf_sha, fingerprint = calculate_digests(stream, size)
+                if lf_sha is not None and lf_sha != sha:
+                    lf_shas.append(lf_sha)
+                if fingerprint is not None:
+                    fingerprints.append(fingerprint)
+            for path, shas in [(lf_path, lf_shas), (ws_path, fingerprints)]:
+                old = (
+                    load_array(path, BLOB_DTYPE)
+                    if start and os.path.exists(path)
+                    else []
+                )
+                arr = np.union1d(np.asarray(old, dtype=BLOB_DTYPE), hex_to_bin(shas))
+                with open(path + ".tmp", "wb") as f:
+                    f.write(np.ascontiguousarray(arr, dtype=BLOB_DTYPE).tobytes())
+                os.replace(path + ".tmp", path)
+            # replaced last, so an interrupted update is read again next time
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(
+                    {"num_blobs": len(index.blobs), "generation": index.generation}, f
+                )
+            os.replace(meta_path + ".tmp", meta_path)
+        return BlobSet(load_array(lf_path, BLOB_DTYPE)), BlobSet(
+            load_array(ws_path, BLOB_DTYPE)
+        )
 
     @cached_property
     def blob_shas(self) -> list[str]:
         """return a list of all blob shas"""
-
-        nodes_path = os.path.join(self.data_folder, "index.json")
-        if not os.path.exists(nodes_path):
-            logger.info(f"index.json not exists, start traversing all commits")
-            self.traverse_all()
-        logger.info(f"loading from index.json")
-        nodes = json.load(open(nodes_path))
-        return list(nodes["blob"].keys())
+        return self.index.blob_shas
 
     @cached_property
     def file_names(self) -> list[str]:
-        nodes_path = os.path.join(self.data_folder, "index.json")
-        if not os.path.exists(nodes_path):
-            logger.info(f"index.json not exists, start traversing all commits")
-            self.traverse_all()
-        logger.info(f"loading from index.json")
-        nodes = json.load(open(nodes_path))
-        return list(nodes["filename"].keys())
+        return self.index.filenames
 
     def read_blob_content(self, blob_sha: str) -> str:
         """read the content of a blob object
@@ -430,7 +1162,38 @@ class Repository:
         Returns:
             str: the content of the blob object
         """
-        return self.repo.git.cat_file("-p", blob_sha)
+        return self.reader.read_blob(blob_sha).decode("utf-8", errors="replace")
+
+    def close(self):
+        """terminate the `git cat-file --batch` processes of the repository and its submodules, and flush the tree memo"""
+        for reader in [self.reader, *self.submodule_readers.values()]:
+            if reader:
+                reader.close()
+        if self.memo:
+            self.memo.close()
+
+
+def index_range(
+    url: str,
+    base_folder: str,
+    commits: list[tuple[str, int, Optional[str]]],
+    folder: str,
+    tree_cache_size: int = 30000,
+    tree_memo: bool = False,
+    checkpoint_interval: int = 64,
+):
+    """index a range of (commit sha, timestamp, first parent sha) to a partial index in `folder`, in a worker process"""
+    repo = Repository(
+        url, base_folder, tree_cache_size=tree_cache_size, tree_memo=tree_memo
+    )
+    # a leftover of an interrupted traversal
+    shutil.rmtree(folder, ignore_errors=True)
+    writer = RepoIndexWriter(folder, checkpoint_interval=checkpoint_interval)
+    for commit_sha, ts, parent_sha in commits:
+        writer.append_commit(commit_sha, ts, repo.snapshot(commit_sha), parent_sha)
+    writer.close()
+    repo.close()
+    logger.info(f"finish indexing {len(commits)} commits of {url}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+import logging
+import os
+import sqlite3
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TreeMemo:
+    def __init__(
+        self, path: str, commit_interval: int = 1000, max_trees: int = 1000000
+    ) -> None:
+        """A persistent, content-addressed memo of git tree objects shared by all repositories on the host.
+
+        Tree objects are immutable and named by the hash of their content, so the raw tree
+        (i.e., its direct entries with references to blobs, subtrees and submodule commits)
+        can be reused by every repository that contains it, such as forks and vendored subtrees.
+        The memo is a SQLite database in WAL mode, so concurrent workers can read and populate it.
+
+        The memo only saves reading trees from the object database, they are still parsed and
+        flattened by every repository, so it mainly pays off when trees are expensive to read.
+        It holds at most `max_trees` trees, the oldest trees are evicted first.
+
+        Args:
+            path (str): the path of the SQLite database
+            commit_interval (int, optional): the number of inserts buffered before a commit. Defaults to 1000.
+            max_trees (int, optional): the maximum number of memoized trees. Defaults to 1000000.
+        """
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_trees = max_trees
+        # inserts are buffered and written in one short transaction, so that no connection
+        # holds the write lock while it is traversing
+        self.pending: dict[bytes, bytes] = {}
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # connect lazily, so that the memo can be created before worker processes fork
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            # the rowid follows the insertion order, which is the eviction order
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS trees (sha BLOB UNIQUE NOT NULL, data BLOB NOT NULL)"
+            )
+            # the unbounded table of earlier versions
+            self._conn.execute("DROP TABLE IF EXISTS tree")
+        return self._conn
+
+    def get(self, tree_sha: str) -> Optional[bytes]:
+        """get the raw content of a tree object, None if it is not memoized yet"""
+        sha = bytes.fromhex(tree_sha)
+        if sha in self.pending:
+            self.hits += 1
+            return self.pending[sha]
+        row = self.conn.execute(
+            "SELECT data FROM trees WHERE sha = ?", (sha,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, tree_sha: str, data: bytes):
+        """memoize the raw content of a tree object"""
+        self.pending[bytes.fromhex(tree_sha)] = data
+        if len(self.pending) >= self.commit_interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            try:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO trees (sha, data) VALUES (?, ?)",
+                        self.pending.items(),
+                    )
+                    # rowids are not reused as long as the newest row is kept
+                    self.conn.execute(
+                        "DELETE FROM trees WHERE rowid <= (SELECT max(rowid) FROM trees) - ?",
+                        (self.max_trees,),
+                    )
+                self.pending = {}
+            except sqlite3.OperationalError as e:
+                # the memo is only a cache, keep the pending inserts for the next flush
+                logger.error(f"Failed to flush tree memo {self.path}: {e}")
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        logger.info(f"tree memo {self.path}: {self.hits} hits, {self.misses} misses")
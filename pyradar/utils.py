@@ -5,13 +5,21 @@ import json
 import logging
 import os
 import tarfile
+import threading
 import urllib.request
 import zipfile
 from collections import OrderedDict
-from typing import Optional, Union
+from functools import cached_property
+from typing import BinaryIO, Optional, Union
+
+from joblib import Parallel, delayed
 
 logger = logging.getLogger(__name__)
 
+# the largest content with CR newlines held in memory by `calculate_digests` to translate them
+MAX_NORMALIZE_SIZE = 1 << 20
+
+WHITESPACE = b" \t\n\r\f\v"
 
 URL_PREFIXES = [
     "0xacab.org",
@@ -136,6 +144,80 @@ def calculate_sha(content: Union[bytes, str]) -> Optional[str]:
     return sha1.hexdigest()
 
 
+def calculate_sha_stream(
+    stream: BinaryIO, size: int, chunk_size: int = 1 << 16
+) -> Optional[str]:
+    """the git blob sha of `size` bytes read from `stream` in chunks of at most `chunk_size` bytes
+
+    The same as `calculate_sha(stream.read())`, without holding the whole content in memory.
+    The size of archive members is known from their headers before they are read.
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(f"blob {size}\0".encode())
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        sha1.update(chunk)
+        remaining -= len(chunk)
+    if remaining != 0 or stream.read(1):
+        logger.error(f"The stream does not have the expected {size} bytes")
+        return None
+    return sha1.hexdigest()
+
+
+def calculate_digests(
+    stream: BinaryIO, size: int, chunk_size: int = 1 << 16
+) -> tuple[Optional[str], Optional[str], Optional[str]]:
+    """the digests of `size` bytes read from `stream` in one pass, to match files that differ in whitespace only
+
+    1. the git blob sha, i.e., `calculate_sha_stream`
+    2. the git blob sha of the content with CRLF and CR newlines translated to LF. It is the git blob
+       sha if the content has no CR. Otherwise, the content is buffered to learn the translated size
+       for the blob header, and None if the content is larger than `MAX_NORMALIZE_SIZE`.
+    3. the SHA-1 of the content without any ASCII whitespace, see `whitespace_fingerprint`
+
+    Returns:
+        tuple[Optional[str], Optional[str], Optional[str]]: all None if the stream does not have `size` bytes
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(f"blob {size}\0".encode())
+    fingerprint = hashlib.sha1()
+    buffered = [] if size <= MAX_NORMALIZE_SIZE else None
+    has_cr = False
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        sha1.update(chunk)
+        fingerprint.update(chunk.translate(None, WHITESPACE))
+        has_cr = has_cr or (b"\r" in chunk)
+        if buffered is not None:
+            buffered.append(chunk)
+        remaining -= len(chunk)
+    if remaining != 0 or stream.read(1):
+        logger.error(f"The stream does not have the expected {size} bytes")
+        return None, None, None
+    sha = sha1.hexdigest()
+    if not has_cr:
+        lf_sha = sha
+    elif buffered is not None:
+        lf_sha = calculate_sha(
+            b"".join(buffered).replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        )
+    else:
+        lf_sha = None
+    return sha, lf_sha, fingerprint.hexdigest()
+
+
+def whitespace_fingerprint(content: bytes) -> str:
+    """the SHA-1 of the content without any ASCII whitespace, equal for files that only differ in
+    indentation, trailing whitespace, blank lines or newlines"""
+    return hashlib.sha1(content.translate(None, WHITESPACE)).hexdigest()
+
+
 def configure_logger(name: str, log_file: str, level: int):
     logger = logging.getLogger(name)
     logger.setLevel(level)
@@ -197,13 +279,25 @@ class ZipReader:
         self,
         file_path: str,
         translate_newline: bool = False,
+        threads: int = 1,
     ) -> None:
+        """A reader of zip archives, e.g., wheels and eggs.
+
+        Args:
+            file_path (str): the path of the archive
+            translate_newline (bool, optional): translate the newlines of `setup.py` and
+                `pyproject.toml`. Defaults to False.
+            threads (int, optional): the number of threads hashing members in parallel, each
+                with its own handle of the archive. zlib and hashlib release the GIL, so this
+                speeds up large archives. Defaults to 1.
+        """
         self.file_path = file_path
         self.translate_newline = translate_newline
+        self.threads = threads
         self.file = zipfile.ZipFile(self.file_path)
 
-    @property
-    def top_level_modules(self):
+    @cached_property
+    def top_level_modules(self) -> list[str]:
         top_level = []
         if self.file_path.endswith(".whl"):
             try:
@@ -228,86 +322,208 @@ class ZipReader:
                 pass
         return top_level
 
+    def is_excluded(self, name: str) -> bool:
+        if name.endswith("/"):
+            return True
+        if self.top_level_modules and (
+            name.split("/")[0] not in self.top_level_modules
+        ):
+            return True
+
+        if name.rsplit("/", 1)[-1] == "PKG-INFO":
+            return True
+
+        if name.rsplit("/", 1)[0].endswith("EGG-INFO"):
+            return True
+
+        if name.rsplit("/", 1)[0].endswith(".dist-info"):
+            return True
+
+        if name.rsplit("/", 1)[0].endswith(".egg-info"):
+            return True
+        return False
+
     def file_shas(self) -> list[tuple[str, str]]:
-        res = []
-        for name in self.file.namelist():
-            if name.endswith("/"):
-                continue
-            if self.top_level_modules and (
-                name.split("/")[0] not in self.top_level_modules
-            ):
-                continue
+        return self._file_hashes(digests=False)
 
-            if name.rsplit("/", 1)[-1] == "PKG-INFO":
-                continue
+    def file_digests(self) -> list[tuple[str, str, Optional[str], str]]:
+        """the (path, git blob sha, LF-normalized git blob sha, whitespace fingerprint) of each file,
+        see `calculate_digests`"""
+        return [(name, *digests) for name, digests in self._file_hashes(digests=True)]
 
-            if name.rsplit("/", 1)[0].endswith("EGG-INFO"):
-                continue
+    def _file_hashes(self, digests: bool) -> list[tuple[str, Union[str, tuple]]]:
+        names = [name for name in self.file.namelist() if not self.is_excluded(name)]
+        if self.threads <= 1 or len(names) <= 1:
+            return [(name, self.file_sha(name, digests=digests)) for name in names]
 
-            if name.rsplit("/", 1)[0].endswith(".dist-info"):
-                continue
+        # a `ZipFile` handle shares one file position, so every thread opens its own
+        local = threading.local()
+        handles = []
 
-            if name.rsplit("/", 1)[0].endswith(".egg-info"):
-                continue
+        def thread_file_sha(name: str) -> Optional[str]:
+            if not hasattr(local, "file"):
+                local.file = zipfile.ZipFile(self.file_path)
+                handles.append(local.file)
+            return self.file_sha(name, local.file, digests)
 
-            content = self.get_file_content(name)
-            res.append((name, calculate_sha(content)))
-        return res
+        try:
+            # results are returned in the order of `names`
+            shas = Parallel(n_jobs=self.threads, backend="threading")(
+                delayed(thread_file_sha)(name) for name in names
+            )
+        finally:
+            for handle in handles:
+                handle.close()
+        return list(zip(names, shas))
+
+    def translates(self, filename: str) -> bool:
+        return self.translate_newline and (
+            os.path.basename(filename) in ["setup.py", "pyproject.toml"]
+        )
+
+    def file_sha(
+        self,
+        filename: str,
+        file: Optional[zipfile.ZipFile] = None,
+        digests: bool = False,
+    ) -> Union[Optional[str], tuple]:
+        """the git blob sha (or all `calculate_digests` if `digests`) of a member, only read into
+        memory if its newlines may be translated"""
+        file = file or self.file
+        if self.translates(filename):
+            content = self._read(file, filename)
+            if digests:
+                return calculate_digests(io.BytesIO(content), len(content))
+            return calculate_sha(content)
+        size = file.getinfo(filename).file_size
+        with file.open(filename) as f:
+            if digests:
+                return calculate_digests(f, size)
+            return calculate_sha_stream(f, size)
 
     def get_file_content(self, filename: str) -> str:
+        return self._read(self.file, filename)
+
+    def _read(self, file: zipfile.ZipFile, filename: str) -> bytes:
         ## translate \r\n to \n
-        res = self.file.open(filename).read()
-        if self.translate_newline and (
-            os.path.basename(filename) in ["setup.py", "pyproject.toml"]
-        ):
+        res = file.open(filename).read()
+        if self.translates(filename):
             try:
                 res.decode()
-                return replace_newline(self.file.open(filename).readlines())
+                return replace_newline(file.open(filename).readlines())
             except:
                 pass
         return res
 
 
 class TarReader:
-    def __init__(self, file_path: str, translate_newline: bool = False) -> None:
+    def __init__(
+        self, file_path: str, translate_newline: bool = False, streaming: bool = True
+    ) -> None:
+        """A reader of tar archives, e.g., source distributions.
+
+        Args:
+            file_path (str): the path of the archive
+            translate_newline (bool, optional): accepted for compatibility with `ZipReader`, the newlines
+                of tar members are never translated. Earlier versions discarded the translated `setup.py`,
+                so translating it now would change the shas of existing caches and datasets.
+                Defaults to False.
+            streaming (bool, optional): hash the members in one sequential pass over the archive.
+                Otherwise, members are looked up by name and extracted one by one, which seeks
+                backwards in the compressed stream and restarts the decompression. Defaults to True.
+        """
         self.file_path = file_path
         self.translate_newline = translate_newline
-        self.file = tarfile.open(self.file_path)
+        self.streaming = streaming
+
+    @cached_property
+    def file(self) -> tarfile.TarFile:
+        return tarfile.open(self.file_path)
+
+    @staticmethod
+    def is_excluded(member: tarfile.TarInfo) -> bool:
+        if not member.isreg():
+            return True
+        if member.name.rsplit("/", 1)[-1] == "PKG-INFO":
+            return True
+        if member.name.rsplit("/", 1)[0].endswith(".egg-info"):
+            return True
+        return False
 
     def file_shas(self) -> list[tuple[str, str]]:
+        return self._file_hashes(digests=False)
+
+    def file_digests(self) -> list[tuple[str, str, Optional[str], str]]:
+        """the (path, git blob sha, LF-normalized git blob sha, whitespace fingerprint) of each file,
+        see `calculate_digests`"""
+        return [(name, *digests) for name, digests in self._file_hashes(digests=True)]
+
+    def _file_hashes(self, digests: bool) -> list[tuple[str, Union[str, tuple]]]:
+        if self.streaming:
+            return self._stream_file_hashes(digests)
         res = []
         for member in self.file.getmembers():
-            if member.isreg():
-                if member.name.rsplit("/", 1)[-1] == "PKG-INFO":
-                    continue
-                if member.name.rsplit("/", 1)[0].endswith(".egg-info"):
-                    continue
-                content = self.get_file_content(member.name)
-                res.append(
-                    (
-                        member.name,
-                        calculate_sha(content),
-                    )
+            if self.is_excluded(member):
+                continue
+            res.append(
+                (
+                    member.name,
+                    self.member_sha(
+                        self.file, self.file.getmember(member.name), digests
+                    ),
                 )
+            )
         return res
 
-    def get_file_content(self, filename: str) -> str:
-        res = self.file.extractfile(filename).read()
-        if self.translate_newline and (os.path.basename(filename) == "setup.py"):
-            res.replace(b"\r\n", b"\n")
-            res.replace(b"\r", b"\n")
+    def _stream_file_hashes(self, digests: bool) -> list[tuple[str, Union[str, tuple]]]:
+        res = []
+        # "r|*" never seeks, each member is read while the decompressor passes it
+        with tarfile.open(self.file_path, "r|*") as f:
+            for member in f:
+                if self.is_excluded(member):
+                    continue
+                res.append((member.name, self.member_sha(f, member, digests)))
         return res
 
+    def member_sha(
+        self, file: tarfile.TarFile, member: tarfile.TarInfo, digests: bool = False
+    ) -> Union[Optional[str], tuple]:
+        """the git blob sha (or all `calculate_digests` if `digests`) of a member, hashed as it is read"""
+        if digests:
+            return calculate_digests(file.extractfile(member), member.size)
+        return calculate_sha_stream(file.extractfile(member), member.size)
+
+    def get_file_content(self, filename: str) -> str:
+        return self.file.extractfile(filename).read()
+
 
 class DistReader:
-    def __init__(self, file_path: str, translate_newline: bool = False) -> None:
+    def __init__(
+        self,
+        file_path: str,
+        translate_newline: bool = False,
+        streaming: bool = True,
+        threads: int = 1,
+    ) -> None:
+        """A reader of distribution archives.
+
+        Args:
+            file_path (str): the path of the archive
+            translate_newline (bool, optional): see `TarReader` and `ZipReader`. Defaults to False.
+            streaming (bool, optional): read tar archives in one pass, see `TarReader`. Defaults to True.
+            threads (int, optional): the number of threads hashing the members of zip archives,
+                see `ZipReader`. Defaults to 1.
+        """
         if file_path.endswith(".tar.gz"):
-            self.reader = TarReader(file_path, translate_newline)
+            self.reader = TarReader(file_path, translate_newline, streaming)
         elif any(file_path.endswith(suffix) for suffix in [".zip", ".whl", ".egg"]):
-            self.reader = ZipReader(file_path, translate_newline)
+            self.reader = ZipReader(file_path, translate_newline, threads)
 
     def file_shas(self) -> list[tuple[str, str]]:
         return self.reader.file_shas()
 
+    def file_digests(self) -> list[tuple[str, str, Optional[str], str]]:
+        return self.reader.file_digests()
+
     def get_file_content(self, filename: str) -> str:
         return self.reader.get_file_content(filename)
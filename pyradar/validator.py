@@ -2,16 +2,20 @@ import json
 import logging
 import os
 import re
+from datetime import datetime, timedelta, timezone
 from functools import cached_property
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 from joblib import load
 from Levenshtein import ratio
 from pymongo import MongoClient
 
+from pyradar.dist_cache import DIST_CACHE_FILE, DistCache
+from pyradar.index import BlobSet
 from pyradar.repository import Repository
-from pyradar.utils import DistReader, download, get_downloads_data, get_maintainer_info
+from pyradar.utils import download, get_downloads_data, get_maintainer_info
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +44,11 @@ class Validator:
         base_folder: str,
         packagetype: str = "sdist",
         translate_newline: bool = True,
+        grace_days: Optional[int] = None,
+        tag_anchored: bool = False,
+        tag_ancestors: int = 0,
+        near_match: bool = False,
+        fast_blob_set: bool = False,
     ) -> None:
         """Configure package's name, version, and data folder.
 
@@ -47,6 +56,16 @@ class Validator:
             name (str): package name
             base_folder (str): should be the environment variable `$DATA_HOME`.
             version (str, optional): package version. If None, use the latest version. Defaults to None.
+            grace_days (Optional[int], optional): if set, only compare against the commits authored up to
+                `grace_days` days after the upload time of the release. Defaults to None (all commits).
+            tag_anchored (bool, optional): if the release matches a tag, only compare against the commit
+                the tag points to (see `Repository.tag_blob_set`). Defaults to False.
+            tag_ancestors (int, optional): the number of nearest ancestors of the tagged commit also
+                compared against when `tag_anchored`. Defaults to 0.
+            near_match (bool, optional): files that only differ from a repository file in newlines or
+                whitespace are not phantom files (see `near_match_mask`). Defaults to False.
+            fast_blob_set (bool, optional): compare against the blobs of the object database instead
+                of the traversed commits, see `Repository`. Defaults to False.
         """
         self.name = name
         self.version = version
@@ -55,14 +74,51 @@ class Validator:
         self.distribution_folder = os.path.join(base_folder, "distribution", self.name)
         self.packagetype = packagetype
         self.translate_newline = translate_newline
+        self.grace_days = grace_days
+        self.tag_anchored = tag_anchored
+        self.tag_ancestors = tag_ancestors
+        self.near_match = near_match
+        self.fast_blob_set = fast_blob_set
 
     @cached_property
     def repository(self) -> Optional[Repository]:
         if self.repository_url:
-            return Repository(url=self.repository_url, base_folder=self.base_folder)
+            return Repository(
+                url=self.repository_url,
+                base_folder=self.base_folder,
+                fast_blob_set=self.fast_blob_set,
+            )
 
         return None
 
+    @cached_property
+    def distribution_file_info(self) -> Optional[dict]:
+        return dist_file_info.find_one(
+            {
+                "name": self.name,
+                "version": self.version,
+                "packagetype": self.packagetype,
+            }
+        )
+
+    @cached_property
+    def upload_time(self) -> Optional[datetime]:
+        data = self.distribution_file_info
+        if not data or not data.get("upload_time"):
+            return None
+        upload_time = datetime.fromisoformat(str(data["upload_time"]))
+        if upload_time.tzinfo is None:
+            # PyPI upload times are in UTC
+            upload_time = upload_time.replace(tzinfo=timezone.utc)
+        return upload_time
+
+    @cached_property
+    def release_window(self) -> Optional[int]:
+        """the latest authored timestamp of the commits compared against the release, None for all commits"""
+        if self.grace_days is None or self.upload_time is None:
+            return None
+        return int((self.upload_time + timedelta(days=self.grace_days)).timestamp())
+
     @cached_property
     def distribution_files(self) -> list[tuple[str, str]]:
         """get distribution urls (if have) of the release.
@@ -70,49 +126,157 @@ class Validator:
         Returns:
             dict[str, str]: three kay-value pairs corresponding to packagetypes: `sdist`, `bdist_wheel`, `bdist_egg` respectively
         """
+        if self.near_match:
+            # all digests are computed in the same pass over the distribution
+            return [(fname, fsha) for fname, fsha, _, _ in self.distribution_digests]
         res = []
-        data = dist_file_info.find_one(
-            {
-                "name": self.name,
-                "version": self.version,
-                "packagetype": self.packagetype,
-            }
-        )
-        if data:
-            url = data["url"]
-            filename = data["filename"]
-            if not filename.endswith(ACCEPTED_EXTENSIONS):
-                return res
-            save_path = os.path.join(self.distribution_folder, filename)
-            download(url, save_path)
-            for fname, fsha in DistReader(
-                save_path, self.translate_newline
-            ).file_shas():
+        if self.distribution_path:
+            for fname, fsha in self.dist_cache.file_shas(
+                self.distribution_path,
+                self.translate_newline,
+                sha256=self.distribution_file_info.get("sha256"),
+            ):
                 res.append((fname, fsha))
         return res
 
     @cached_property
-    def phantom_files(self) -> list[list[str, str]]:
-        res = []
+    def distribution_digests(self) -> list[tuple[str, str, Optional[str], str]]:
+        """the digests of the distribution files, see `DistReader.file_digests`"""
+        if not self.distribution_path:
+            return []
+        return self.dist_cache.file_digests(
+            self.distribution_path,
+            self.translate_newline,
+            sha256=self.distribution_file_info.get("sha256"),
+        )
+
+    @cached_property
+    def distribution_path(self) -> Optional[str]:
+        """the local path of the distribution of the release, downloaded if needed"""
+        data = self.distribution_file_info
+        if not data or not data["filename"].endswith(ACCEPTED_EXTENSIONS):
+            return None
+        save_path = os.path.join(self.distribution_folder, data["filename"])
+        download(data["url"], save_path)
+        return save_path
+
+    @cached_property
+    def dist_cache(self) -> DistCache:
+        return DistCache(os.path.join(self.base_folder, DIST_CACHE_FILE))
+
+    def close(self):
+        """close the distribution cache and the repository if they were opened"""
+        dist_cache = self.__dict__.pop("dist_cache", None)
+        if dist_cache is not None:
+            dist_cache.close()
+        repository = self.__dict__.pop("repository", None)
+        if repository is not None:
+            repository.close()
+
+    @cached_property
+    def compared_blob_set(self) -> BlobSet:
+        """the blobs of the repository the distribution files are compared against"""
+        if self.tag_anchored and self.matched_tag is not None:
+            # the release is compared against its own tag only
+            blob_set = self.repository.tag_blob_set(
+                self.matched_tag, self.tag_ancestors
+            )
+            # a tag of a tree or a blob anchors nothing, fall back to the whole repository
+            if blob_set is not None:
+                return blob_set
+        if self.release_window is not None:
+            # blobs committed after the window cannot have been packaged into the release
+            return self.repository.window_blob_set(self.release_window)
+        return self.repository.blob_set
+
+    @cached_property
+    def phantom_mask(self) -> np.ndarray:
+        """a boolean array marking the distribution files whose blobs are not in the repository"""
         if self.distribution_files and self.repository:
-            repo_blob_shas = self.repository.blob_shas
-            res = [
-                [fname, fsha]
-                for fname, fsha in self.distribution_files
-                if fsha not in repo_blob_shas
-            ]
+            fshas = [fsha for _, fsha in self.distribution_files]
+            mask = ~self.compared_blob_set.contains(fshas)
+            if self.near_match:
+                mask &= ~self.near_match_mask
+            return mask
+        return np.zeros(0, dtype=bool)
 
-        return res
+    @cached_property
+    def near_match_mask(self) -> np.ndarray:
+        """a boolean array marking the distribution files that match a repository blob after translating
+        newlines to LF, or after removing all whitespace
+
+        The LF-normalized sha of a file is looked up in the compared blobs and in the LF-normalized
+        blobs of the repository, and its whitespace fingerprint in the fingerprints of the repository
+        (see `Repository.blob_variants`). The variants of the repository blobs are not restricted
+        to the release window or tag. Without them (see `near_match_complete`), only files whose
+        LF-normalized sha is a compared blob are marked.
+        """
+        if not self.distribution_digests or not self.repository:
+            return np.zeros(0, dtype=bool)
+        lf_shas = [lf_sha or fsha for _, fsha, lf_sha, _ in self.distribution_digests]
+        mask = self.compared_blob_set.contains(lf_shas)
+        if not self.near_match_complete:
+            logger.error(
+                f"{self.name} {self.version}: no blob variants of {self.repository_url}, "
+                "near matches are incomplete"
+            )
+            return mask
+        lf_blob_set, fingerprint_set = self.repository.blob_variants
+        fingerprints = [
+            fingerprint for _, _, _, fingerprint in self.distribution_digests
+        ]
+        return (
+            mask
+            | lf_blob_set.contains(lf_shas)
+            | fingerprint_set.contains(fingerprints)
+        )
+
+    @property
+    def near_match_complete(self) -> bool:
+        """whether the blob variants of the repository are available to `near_match_mask`,
+        they are not for partial (e.g., blobless) clones"""
+        return self.repository is not None and self.repository.blob_variants is not None
+
+    @cached_property
+    def release_commit(self) -> Optional[tuple[str, int, list[list[str]]]]:
+        """the commit the distribution was most likely built from, see `Repository.locate_release`"""
+        if self.distribution_files and self.repository:
+            located = self.repository.locate_release(self.distribution_files)
+            if located:
+                return located[0]
+        return None
+
+    @cached_property
+    def phantom_files(self) -> list[list[str, str]]:
+        return [
+            [fname, fsha]
+            for (fname, fsha), phantom in zip(
+                self.distribution_files, self.phantom_mask
+            )
+            if phantom
+        ]
 
     @cached_property
     def num_phantom_pyfiles(self) -> int:
         if (not self.distribution_files) or (not self.repository):
             return -1
-        cnt = 0
-        for fname, _ in self.phantom_files:
-            if fname.endswith(".py"):
-                cnt += 1
-        return cnt
+        fnames = np.array([fname for fname, _ in self.distribution_files], dtype=str)
+        return int((self.phantom_mask & np.char.endswith(fnames, ".py")).sum())
+
+    @cached_property
+    def late_files(self) -> list[list[str]]:
+        """distribution files whose blobs only appeared in the repository after the release was uploaded"""
+        if not self.distribution_files or not self.repository or not self.upload_time:
+            return []
+        upload_ts = self.upload_time.timestamp()
+        history = self.repository.blob_history(
+            [fsha for _, fsha in self.distribution_files]
+        )
+        return [
+            [fname, fsha]
+            for (fname, fsha), first_seen in zip(self.distribution_files, history)
+            if first_seen is not None and first_seen[1] > upload_ts
+        ]
 
     @cached_property
     def setup_change(self) -> int:
@@ -142,15 +306,20 @@ class Validator:
         return len(pkg_maintainers.get(self.name, []))
 
     @cached_property
-    def tag_match(self) -> int:
+    def matched_tag(self) -> Optional[str]:
+        """the first tag whose name matches the release version, None if no tag matches"""
         for tag in self.repository.tag_shas:
             if self.version == tag:
-                return 1
+                return tag
             if tag.endswith(self.version):
-                return 1
+                return tag
             if sub_pattern.sub(".", tag).endswith(sub_pattern.sub(".", self.version)):
-                return 1
-        return 0
+                return tag
+        return None
+
+    @cached_property
+    def tag_match(self) -> int:
+        return int(self.matched_tag is not None)
 
     @cached_property
     def num_maintainer_pkgs(self) -> int:
@@ -12,7 +12,9 @@ import requests
 from Levenshtein import ratio
 from pymongo import MongoClient
 
-from pyradar.utils import DistReader, download, normalize_url, restore_url
+from pyradar.blob_index import BlobIndex
+from pyradar.dist_cache import DIST_CACHE_FILE, DistCache
+from pyradar.utils import download, normalize_url, restore_url
 
 dist_info = MongoClient("127.0.0.1", 27017)["radar"]["distribution_file_info"]
 
@@ -125,7 +127,9 @@ def select_final(
         return
     res = []
     for woc_uri, _ in most_common:
-        deforked_url = defork(restore_url(woc_uri), session)
+        # candidates from the local blob index are urls already
+        url = woc_uri if woc_uri.startswith("https://") else restore_url(woc_uri)
+        deforked_url = defork(url, session)
         if deforked_url:
             res.append(deforked_url)
     if not res:
@@ -143,6 +147,7 @@ class WoCRetriever:
         packagetype: str = "sdist",
         mirror: Optional[str] = None,
         translate_newline: bool = True,
+        blob_index: Optional[BlobIndex] = None,
     ) -> None:
         self.name = name
         self.version = version
@@ -150,6 +155,8 @@ class WoCRetriever:
         self.packagetype = packagetype
         self.mirror = mirror
         self.translate_newline = translate_newline
+        # if given, look up projects offline in the index of locally cloned repositories instead of WoC
+        self.blob_index = blob_index
         self.session = requests.Session()
         self.session.headers.update(headers)
         if token:
@@ -176,12 +183,31 @@ class WoCRetriever:
             if self.mirror:
                 url = url.replace("https://files.pythonhosted.org", self.mirror)
             download(url, save_path)
-            for fname, fsha in DistReader(
-                save_path, self.translate_newline
-            ).file_shas():
+            dist_cache = DistCache(os.path.join(self.base_folder, DIST_CACHE_FILE))
+            for fname, fsha in dist_cache.file_shas(
+                save_path, self.translate_newline, sha256=sdist.get("sha256")
+            ):
                 res.append((fname, fsha))
+            dist_cache.close()
         return res
 
+    @cached_property
+    def local_projects(self) -> dict[str, list[str]]:
+        """the local repositories containing each distribution blob, looked up in one batch"""
+        shas = [sha for _, sha in self.fileshas]
+        return dict(zip(shas, self.blob_index.lookup(shas)))
+
+    def query_projects(self, sha: str) -> list[str]:
+        if self.blob_index is not None:
+            return self.local_projects.get(sha, [])
+        return query_b2p(sha)
+
+    def query_deforked(self, proj: str) -> str:
+        if self.blob_index is not None:
+            # local repositories are deduplicated by `defork` in `select_final`
+            return proj
+        return query_p2P(proj)
+
     def get_candidates(self, blob_uniqueness: int = 500):
         py_candidates = {}
         setup_candidates = set()
@@ -192,7 +218,7 @@ class WoCRetriever:
                 continue
 
             if os.path.basename(name) == "pyproject.toml":
-                projs = query_b2p(sha)
+                projs = self.query_projects(sha)
                 if len(projs) > blob_uniqueness:
                     continue
                 for p in projs:
@@ -200,13 +226,13 @@ class WoCRetriever:
                     if tmp_p2P.get(p, None):
                         setup_candidates.add(tmp_p2P[p])
                     else:
-                        P = query_p2P(p)
+                        P = self.query_deforked(p)
                         tmp_p2P[p] = P
                         setup_candidates.add(P)
                 continue
 
             if name.endswith(".py"):
-                projs = query_b2p(sha)
+                projs = self.query_projects(sha)
                 if len(projs) > blob_uniqueness:
                     continue
                 num_pyfiles += 1
@@ -214,7 +240,7 @@ class WoCRetriever:
                 for p in projs:
                     tmp.add(p)
                     if not (p in tmp_p2P):
-                        P = query_p2P(p)
+                        P = self.query_deforked(p)
                         tmp_p2P[p] = P
                     tmp.add(tmp_p2P[p])
                 for p in tmp:
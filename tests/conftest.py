@@ -0,0 +1,64 @@
+import os
+import subprocess
+
+import pytest
+
+REPO_URL = "https://github.com/pyradar/example"
+SUBMODULE_URL = "https://github.com/pyradar/submodule"
+
+
+def git(cwd: str, *args: str) -> str:
+    return subprocess.check_output(
+        ["git", "-c", "protocol.file.allow=always", *args], cwd=cwd, text=True
+    ).strip()
+
+
+def commit_files(
+    path: str, files: dict[str, str], ts: int, gitlinks: dict[str, str] = {}
+) -> str:
+    for name, content in files.items():
+        file_path = os.path.join(path, name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w") as f:
+            f.write(content)
+        git(path, "add", name)
+    for name, sha in gitlinks.items():
+        git(path, "update-index", "--add", "--cacheinfo", f"160000,{sha},{name}")
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_DATE": f"@{ts} +0000",
+        "GIT_COMMITTER_DATE": f"@{ts} +0000",
+    }
+    subprocess.check_call(
+        ["git", "commit", "-q", "-m", f"commit {ts}"], cwd=path, env=env
+    )
+    return git(path, "rev-parse", "HEAD")
+
+
+def init_repo(base_folder: str, url: str) -> str:
+    path = os.path.join(base_folder, "repository", *url.split("/")[2:], "repo")
+    os.makedirs(path)
+    git(path, "init", "-q")
+    git(path, "config", "user.name", "pyradar")
+    git(path, "config", "user.email", "pyradar@example.com")
+    return path
+
+
+@pytest.fixture
+def base_folder(tmp_path) -> str:
+    sm_path = init_repo(str(tmp_path), SUBMODULE_URL)
+    sm_commit = commit_files(sm_path, {"lib.py": "print('lib')\n"}, 1600000000)
+
+    path = init_repo(str(tmp_path), REPO_URL)
+    commit_files(path, {"setup.py": "setup()\n", "pkg/__init__.py": ""}, 1600000000)
+    commit_files(
+        path,
+        {
+            "pkg/core.py": "x = 1\n",
+            "tests/__init__.py": "# tests\n",
+            ".gitmodules": f'[submodule "vendor"]\n\tpath = vendor\n\turl = {SUBMODULE_URL}\n',
+        },
+        1600001000,
+    )
+    commit_files(path, {}, 1600002000, gitlinks={"vendor": sm_commit})
+    return str(tmp_path)
@@ -0,0 +1,115 @@
+import os
+import shutil
+
+from pyradar.blob_index import BlobIndex, build
+from pyradar.repository import Repository
+from pyradar.utils import calculate_sha
+from tests.conftest import REPO_URL, SUBMODULE_URL, commit_files
+
+
+class TestBlobIndex:
+    def test_lookup(self, base_folder: str):
+        for url in [REPO_URL, SUBMODULE_URL]:
+            repo = Repository(url, base_folder)
+            repo.traverse_all()
+            repo.close()
+        blob_index = build(base_folder)
+        shas = [
+            calculate_sha("setup()\n"),
+            calculate_sha("print('lib')\n"),
+            calculate_sha("missing"),
+        ]
+        assert blob_index.lookup(shas) == [
+            [REPO_URL],
+            [REPO_URL, SUBMODULE_URL],
+            [],
+        ]
+        assert len(blob_index.meta["segments"]) == 1
+
+    def test_incremental(self, base_folder: str):
+        folder = os.path.join(base_folder, "blob_index")
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        blob_index = BlobIndex(folder, merge_factor=2)
+        blob_index.add_repo(REPO_URL, repo.index_folder)
+        blob_index.flush()
+        num_blobs = len(blob_index)
+
+        commit_files(repo.repo_path, {"pkg/core.py": "x = 2\n"}, 1600003000)
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        repo.close()
+        # only the new blob of the repository is added
+        blob_index = BlobIndex(folder, merge_factor=2)
+        blob_index.add_repo(REPO_URL, repo.index_folder)
+        blob_index.flush()
+        assert len(blob_index) == num_blobs + 1
+        assert len(blob_index.meta["segments"]) == 2
+        assert blob_index.lookup([calculate_sha("x = 2\n")]) == [[REPO_URL]]
+
+        # an empty segment is not written, and segments of different tiers are not merged
+        blob_index.add_repo(REPO_URL, repo.index_folder)
+        blob_index.flush()
+        assert len(blob_index.meta["segments"]) == 2
+        blob_index.compact()
+        assert blob_index.meta["segments"] == [2]
+        assert len(blob_index) == num_blobs + 1
+        assert sorted(os.listdir(folder)) == [
+            "lock",
+            "meta.json",
+            "segment-2-blobs.bin",
+            "segment-2-repos.bin",
+        ]
+
+    def test_tiered_merge(self, base_folder: str):
+        folder = os.path.join(base_folder, "blob_index")
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        blob_index = BlobIndex(folder, merge_factor=2)
+        blob_index.add_repo(REPO_URL, repo.index_folder)
+        blob_index.flush()
+        num_blobs = len(blob_index)
+        assert num_blobs >= 4
+
+        # each update adds a segment of a single blob
+        sizes = []
+        for i in range(3):
+            commit_files(
+                repo.repo_path, {"pkg/core.py": f"x = {i + 2}\n"}, 1600003000 + i
+            )
+            repo = Repository(REPO_URL, base_folder)
+            repo.traverse_all()
+            repo.close()
+            blob_index.add_repo(REPO_URL, repo.index_folder)
+            blob_index.flush()
+            sizes.append(
+                [blob_index._segment_size(s) for s in blob_index.meta["segments"]]
+            )
+        # two single blobs are merged, while the large first segment is never rewritten
+        assert sizes == [[num_blobs, 1], [num_blobs, 2], [num_blobs, 2, 1]]
+        assert blob_index.meta["segments"][0] == 0
+        assert len(blob_index) == num_blobs + 3
+        assert blob_index.lookup([calculate_sha("x = 3\n")]) == [[REPO_URL]]
+
+    def test_rebuilt_index(self, base_folder: str):
+        folder = os.path.join(base_folder, "blob_index")
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        blob_index = BlobIndex(folder)
+        blob_index.add_repo(REPO_URL, repo.index_folder)
+        blob_index.flush()
+        num_blobs = len(blob_index)
+        assert blob_index.meta["repos"] == [
+            [REPO_URL, num_blobs, repo.index.generation]
+        ]
+
+        # a rebuilt index of the same size is added again, as its blob ids may differ
+        shutil.rmtree(repo.index_folder)
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        repo.close()
+        blob_index.add_repo(REPO_URL, repo.index_folder)
+        blob_index.flush()
+        assert len(blob_index) == 2 * num_blobs
+        assert blob_index.meta["repos"][0][2] == repo.index.generation
+        assert blob_index.lookup([calculate_sha("setup()\n")]) == [[REPO_URL]]
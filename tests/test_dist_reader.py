@@ -0,0 +1,167 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from pyradar.dist_cache import DIST_CACHE_FILE, DistCache, file_sha256
+from pyradar.utils import (
+    DistReader,
+    calculate_digests,
+    calculate_sha,
+    calculate_sha_stream,
+    whitespace_fingerprint,
+)
+from pyradar.utils import MAX_NORMALIZE_SIZE
+
+FILES = {
+    "pkg-1.0/PKG-INFO": b"Metadata-Version: 2.1\n",
+    "pkg-1.0/pkg.egg-info/SOURCES.txt": b"setup.py\n",
+    "pkg-1.0/setup.py": b"setup()\r\n",
+    "pkg-1.0/pkg/__init__.py": b"",
+    "pkg-1.0/pkg/core.py": b"x = 1\n",
+}
+
+
+@pytest.fixture
+def sdist(tmp_path) -> str:
+    path = str(tmp_path / "pkg-1.0.tar.gz")
+    with tarfile.open(path, "w:gz") as f:
+        for name, content in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            f.addfile(info, io.BytesIO(content))
+        info = tarfile.TarInfo("pkg-1.0/link.py")
+        info.type = tarfile.SYMTYPE
+        info.linkname = "pkg/core.py"
+        f.addfile(info)
+    return path
+
+
+@pytest.fixture
+def wheel(tmp_path) -> str:
+    path = str(tmp_path / "pkg-1.0-py3-none-any.whl")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as f:
+        f.writestr("pkg/__init__.py", b"")
+        f.writestr("pkg/data.bin", bytes(range(256)) * 1000)
+        f.writestr("pkg/setup.py", b"setup()\r\n")
+        f.writestr("other/__init__.py", b"")
+        f.writestr("pkg-1.0.dist-info/top_level.txt", b"pkg\n")
+        f.writestr("pkg-1.0.dist-info/RECORD", b"")
+    return path
+
+
+def test_calculate_sha_stream():
+    content = bytes(range(256)) * 1000
+    assert calculate_sha_stream(io.BytesIO(content), len(content), 4096) == (
+        calculate_sha(content)
+    )
+    assert calculate_sha_stream(io.BytesIO(b""), 0) == calculate_sha(b"")
+    # the size in the header must be the size of the content
+    assert calculate_sha_stream(io.BytesIO(content), len(content) + 1) is None
+    assert calculate_sha_stream(io.BytesIO(content), len(content) - 1) is None
+
+
+def test_calculate_digests():
+    content = b"def f():\r\n    return 1\r\n"
+    assert calculate_digests(io.BytesIO(content), len(content), 4) == (
+        calculate_sha(content),
+        calculate_sha(b"def f():\n    return 1\n"),
+        whitespace_fingerprint(b"def f():\n\treturn 1 \n\n"),
+    )
+    content = b"x = 1\n"
+    assert calculate_digests(io.BytesIO(content), len(content)) == (
+        calculate_sha(content),
+        calculate_sha(content),
+        whitespace_fingerprint(b"x=1"),
+    )
+    # content with CR newlines larger than `MAX_NORMALIZE_SIZE` is not buffered
+    content = b"x\r\n" * (MAX_NORMALIZE_SIZE // 3 + 1)
+    sha, lf_sha, _ = calculate_digests(io.BytesIO(content), len(content))
+    assert (sha, lf_sha) == (calculate_sha(content), None)
+    assert calculate_digests(io.BytesIO(content), len(content) + 1) == (None,) * 3
+
+
+class TestZipReader:
+    @pytest.mark.parametrize("threads", [1, 4])
+    def test_file_shas(self, wheel: str, threads: int):
+        reader = DistReader(wheel, translate_newline=True, threads=threads)
+        assert reader.file_shas() == [
+            ("pkg/__init__.py", calculate_sha(b"")),
+            ("pkg/data.bin", calculate_sha(bytes(range(256)) * 1000)),
+            ("pkg/setup.py", calculate_sha(b"setup()\n")),
+        ]
+
+
+class TestTarReader:
+    @pytest.mark.parametrize("streaming", [True, False])
+    def test_file_shas(self, sdist: str, streaming: bool):
+        res = DistReader(sdist, translate_newline=True, streaming=streaming).file_shas()
+        assert res == [
+            (name, calculate_sha(FILES[name]))
+            for name in [
+                "pkg-1.0/setup.py",
+                "pkg-1.0/pkg/__init__.py",
+                "pkg-1.0/pkg/core.py",
+            ]
+        ]
+
+    @pytest.mark.parametrize("streaming", [True, False])
+    def test_file_digests(self, sdist: str, streaming: bool):
+        reader = DistReader(sdist, translate_newline=True, streaming=streaming)
+        digests = reader.file_digests()
+        assert [(name, sha) for name, sha, _, _ in digests] == reader.file_shas()
+        assert digests[0] == (
+            "pkg-1.0/setup.py",
+            calculate_sha(b"setup()\r\n"),
+            calculate_sha(b"setup()\n"),
+            whitespace_fingerprint(b"setup()"),
+        )
+
+    def test_get_file_content(self, sdist: str):
+        reader = DistReader(sdist)
+        assert reader.get_file_content("pkg-1.0/pkg/core.py") == b"x = 1\n"
+
+
+class TestDistCache:
+    def test_file_shas(self, sdist: str, tmp_path):
+        cache = DistCache(str(tmp_path / DIST_CACHE_FILE))
+        expected = DistReader(sdist, translate_newline=True).file_shas()
+        assert cache.file_shas(sdist, translate_newline=True) == expected
+        assert (cache.hits, cache.misses) == (0, 1)
+        assert cache.file_shas(sdist, translate_newline=True) == expected
+        assert (cache.hits, cache.misses) == (1, 1)
+        # the results of each `translate_newline` are cached separately
+        cache.file_shas(sdist)
+        assert (cache.hits, cache.misses) == (1, 2)
+        cache.close()
+
+        # the archive is not read on a hit of the given sha256
+        sha256 = file_sha256(sdist)
+        os.remove(sdist)
+        cache = DistCache(str(tmp_path / DIST_CACHE_FILE))
+        assert cache.file_shas(sdist, True, sha256=sha256) == expected
+        # digests are cached separately
+        with pytest.raises(FileNotFoundError):
+            cache.file_digests(sdist, True, sha256=sha256)
+        cache.close()
+
+    def test_file_digests(self, sdist: str, wheel: str, tmp_path):
+        cache = DistCache(str(tmp_path / DIST_CACHE_FILE))
+        for path in [sdist, wheel]:
+            expected = DistReader(path, translate_newline=True).file_digests()
+            assert cache.file_digests(path, translate_newline=True) == expected
+            assert cache.file_digests(path, translate_newline=True) == expected
+        assert (cache.hits, cache.misses) == (2, 2)
+        cache.close()
+
+    def test_context_manager(self, sdist: str, tmp_path):
+        with DistCache(str(tmp_path / DIST_CACHE_FILE)) as cache:
+            cache.file_shas(sdist)
+            assert cache._conn is not None
+        # the connection is closed on exit, and opened again on demand
+        assert cache._conn is None
+        cache.file_shas(sdist)
+        assert (cache.hits, cache.misses) == (1, 1)
+        cache.close()
@@ -0,0 +1,64 @@
+import os
+
+from pyradar.fork_family import ForkFamilies
+from pyradar.repository import Repository
+from pyradar.utils import calculate_sha
+from tests.conftest import REPO_URL, commit_files, git
+
+
+class TestForkFamilies:
+    def test_clone(self, base_folder: str, tmp_path):
+        upstream = Repository(REPO_URL, base_folder).repo_path
+        git(upstream, "config", "uploadpack.allowFilter", "true")
+        fork = str(tmp_path / "fork")
+        git(base_folder, "clone", "-q", upstream, fork)
+        git(fork, "config", "uploadpack.allowFilter", "true")
+        git(fork, "config", "user.name", "pyradar")
+        git(fork, "config", "user.email", "pyradar@example.com")
+        fork_commit = commit_files(fork, {"fork.py": "fork\n"}, 1600003000)
+
+        families = ForkFamilies(str(tmp_path / "fork_families.sqlite"))
+        assert families.probe_roots(f"file://{fork}") == [
+            git(upstream, "rev-list", "--max-parents=0", "HEAD")
+        ]
+        first = families.clone(f"file://{upstream}", str(tmp_path / "a" / "repo"))
+        assert not os.path.exists(
+            os.path.join(first.git_dir, "objects", "info", "alternates")
+        )
+        assert first.git.config("gc.pruneExpire") == "never"
+
+        second = families.clone(f"file://{fork}", str(tmp_path / "b" / "repo"))
+        with open(os.path.join(second.git_dir, "objects", "info", "alternates")) as f:
+            assert os.path.realpath(f.read().strip()) == os.path.realpath(
+                os.path.join(first.git_dir, "objects")
+            )
+        # the member only stores the objects its family does not have
+        local = git(second.working_dir, "count-objects", "-v")
+        stats = dict(line.split(": ") for line in local.split("\n"))
+        num_objects = git(
+            second.working_dir, "rev-list", "--objects", "--all", "--count"
+        )
+        assert int(stats["in-pack"]) < int(num_objects) / 2
+        assert second.head.commit.hexsha == fork_commit
+        assert second.git.show("HEAD:setup.py") == "setup()"
+        families.close()
+
+    def test_member_blob_set(self, base_folder: str, tmp_path):
+        upstream = Repository(REPO_URL, base_folder).repo_path
+        families = ForkFamilies(str(tmp_path / "fork_families.sqlite"))
+        first = families.clone(f"file://{upstream}", str(tmp_path / "a" / "repo"))
+        fork_url = "https://github.com/fork/example"
+        fork_path = os.path.join(base_folder, "repository", "github.com", "fork")
+        families.clone(f"file://{upstream}", os.path.join(fork_path, "example", "repo"))
+        families.close()
+        # a later upstream commit lands in the shared object database only
+        git(first.working_dir, "config", "user.name", "pyradar")
+        git(first.working_dir, "config", "user.email", "pyradar@example.com")
+        commit_files(first.working_dir, {"upstream.py": "upstream\n"}, 1600003000)
+
+        fork = Repository(fork_url, base_folder, fast_blob_set=True)
+        assert calculate_sha("setup()\n") in fork.blob_set
+        assert calculate_sha("upstream\n") not in fork.blob_set
+        assert len(fork.object_shas["commit"]) == 3
+        assert fork.object_shas["tag"] == []
+        fork.close()
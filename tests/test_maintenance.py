@@ -0,0 +1,32 @@
+import os
+
+from pyradar.maintenance import last_maintenance, maintain
+from pyradar.repository import Repository
+from tests.conftest import REPO_URL
+
+
+class TestMaintenance:
+    def test_maintain(self, base_folder: str):
+        summary = maintain(REPO_URL, base_folder, full=True)
+        assert summary["objects_before"]["count"] > 0
+        assert summary["objects_after"]["count"] == 0
+        assert summary["objects_after"]["packs"] == 1
+        assert all(summary["steps"][step] is not None for step in summary["steps"])
+        for key in ["before", "after"]:
+            assert set(summary[key]) == {"object_shas", "commit_shas"}
+        assert last_maintenance(REPO_URL, base_folder) == summary
+
+        repo = Repository(REPO_URL, base_folder)
+        objects = os.path.join(repo.repo.git_dir, "objects")
+        assert os.path.exists(os.path.join(objects, "info", "commit-graph"))
+        assert os.path.exists(os.path.join(objects, "pack", "multi-pack-index"))
+        assert len(repo.commit_shas) == 3
+        assert len(repo.blob_set) > 0
+
+    def test_not_cloned(self, base_folder: str):
+        url = "https://github.com/pyradar/missing"
+        assert maintain(url, base_folder) is None
+        assert last_maintenance(url, base_folder) is None
+        assert not os.path.exists(
+            os.path.join(base_folder, "repository", "github.com", "pyradar", "missing")
+        )
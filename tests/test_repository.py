@@ -0,0 +1,476 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from pyradar.index import RepoIndex, RepoIndexWriter, bin_to_hex
+from pyradar.repository import MEMORY_CHECK_INTERVAL, Repository, list_objects
+from pyradar.tree_memo import TreeMemo
+from pyradar.utils import calculate_sha, whitespace_fingerprint
+from tests.conftest import REPO_URL, SUBMODULE_URL, commit_files, git
+
+
+class TestRepository:
+    def test_snapshot(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        head = repo.repo.head.commit.hexsha
+        files = sorted(repo.snapshot(head), key=lambda x: x[1])
+        assert [name for _, name in files] == [
+            ".gitmodules",
+            "pkg/__init__.py",
+            "pkg/core.py",
+            "setup.py",
+            "tests/__init__.py",
+            "vendor/lib.py",
+        ]
+        assert (calculate_sha("x = 1\n"), "pkg/core.py") in files
+        assert (calculate_sha("print('lib')\n"), "vendor/lib.py") in files
+        # the submodule is read through its own pooled channel
+        assert list(repo.submodule_readers) == [SUBMODULE_URL]
+        repo.close()
+
+    def test_read_blob_content(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        assert repo.read_blob_content(calculate_sha("setup()\n")) == "setup()\n"
+        repo.close()
+
+    def test_traverse_all(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        assert repo.blob_shas == sorted(repo.blob_shas)
+        assert calculate_sha("setup()\n") in repo.blob_shas
+        assert "vendor/lib.py" in repo.file_names
+        assert repo.index.meta["num_commits"] == 3
+
+        head = repo.repo.head.commit.hexsha
+        assert sorted(repo.index.commit_files(head)) == sorted(repo.snapshot(head))
+        assert not any(f.startswith("snapshot-") for f in os.listdir(repo.data_folder))
+        repo.close()
+
+    def test_traverse_all_incremental(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        blobs = repo.index.blobs.copy()
+        filenames = repo.index.filenames
+
+        new_commit = commit_files(
+            repo.repo_path,
+            {"pkg/core.py": "x = 2\n", "README.md": "# pkg\n"},
+            1600003000,
+        )
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        index = repo.index
+        assert index.meta["num_commits"] == 4
+        # existing ids are stable, new blobs and filenames are appended
+        assert (index.blobs[: len(blobs)] == blobs).all()
+        assert index.filenames[: len(filenames)] == filenames
+        assert index.filenames[-1] == "README.md"
+        assert repo.blob_shas == sorted(repo.blob_shas)
+        assert sorted(index.commit_files(new_commit)) == sorted(
+            repo.snapshot(new_commit)
+        )
+        repo.close()
+
+    def test_non_utf8_filename(self, base_folder: str):
+        path = Repository(REPO_URL, base_folder).repo_path
+        # git paths are bytes, decoded with `surrogateescape` like `os.fsdecode`
+        name = os.fsdecode(b"caf\xe9.txt")
+        commit = commit_files(path, {name: "cafe\n"}, 1600003000)
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        assert name in repo.file_names
+        assert (calculate_sha("cafe\n"), name) in repo.index.commit_files(commit)
+        assert repo.blob_history([calculate_sha("cafe\n")])[0][2] == [name]
+        repo.close()
+
+    def test_commit_log(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        log = repo.commit_log
+        assert [ts for _, ts, _ in log] == [1600000000, 1600001000, 1600002000]
+        assert log[0][2] == []
+        for (parent, _, _), (_, _, parents) in zip(log[:-1], log[1:]):
+            assert parents == [parent]
+        assert repo.commit_shas == [(sha, ts) for sha, ts, _ in log]
+        assert sorted(sha for sha, _ in repo.commit_shas) == sorted(
+            repo.object_shas["commit"]
+        )
+        assert repo.commit_parents[log[-1][0]] == [log[-2][0]]
+        repo.close()
+
+    def test_delta_snapshots(self, base_folder: str):
+        path = Repository(REPO_URL, base_folder).repo_path
+        for i in range(4):
+            commit_files(path, {"pkg/core.py": f"x = {i}\n"}, 1600003000 + i)
+        repo = Repository(REPO_URL, base_folder, checkpoint_interval=3)
+        repo.traverse_all()
+        commits = repo.index.commits
+        # deltas are chained to the previous commit and restart at every checkpoint
+        assert commits["depth"].tolist() == [0, 1, 2, 0, 1, 2, 0]
+        assert commits["base"].tolist() == [-1, 0, 1, -1, 3, 4, -1]
+        assert repo.index.meta["num_edges"] < sum(
+            len(repo.snapshot(sha)) for sha, _ in repo.commit_shas
+        )
+        for sha, _ in repo.commit_shas:
+            assert sorted(repo.index.commit_files(sha)) == sorted(repo.snapshot(sha))
+        repo.close()
+
+    @pytest.mark.parametrize("fast_blob_set", [True, False])
+    def test_blob_set(self, base_folder: str, fast_blob_set: bool):
+        repo = Repository(REPO_URL, base_folder, fast_blob_set=fast_blob_set)
+        shas = [calculate_sha("setup()\n"), calculate_sha("missing"), "00" * 20]
+        assert repo.blob_set.contains(shas).tolist() == [True, False, False]
+        assert calculate_sha("print('lib')\n") in repo.blob_set
+        # the fast blob set never traverses commits
+        assert os.path.exists(repo.index_folder) != fast_blob_set
+        assert repo.blob_set.contains(repo.blob_shas).all()
+        repo.close()
+
+    def test_declared_submodules(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        assert repo.declared_submodules == {"vendor": SUBMODULE_URL}
+        repo.close()
+
+    def test_tree_memo(self, base_folder: str):
+        assert Repository(REPO_URL, base_folder).memo is None
+        repo = Repository(REPO_URL, base_folder, tree_memo=True)
+        repo.traverse_all()
+        repo.close()
+        assert repo.memo.misses > 0
+
+        fork_url = "https://github.com/fork/example"
+        fork_path = os.path.join(base_folder, "repository", "github.com", "fork")
+        os.makedirs(fork_path)
+        git(fork_path, "clone", "-q", repo.repo_path, "example/repo")
+        fork = Repository(fork_url, base_folder, tree_memo=True)
+        read = fork.reader.read
+        read_types = []
+
+        def counted_read(sha: str):
+            obj_type, data = read(sha)
+            read_types.append(obj_type)
+            return obj_type, data
+
+        fork.reader.read = counted_read
+        fork.traverse_all()
+        fork.close()
+        # all trees of the fork are read from the memo populated by the upstream repository,
+        # only commits and the .gitmodules blob are read from its object database
+        assert fork.memo.misses == 0 and fork.memo.hits > 0
+        assert b"tree" not in read_types and b"commit" in read_types
+        assert fork.blob_shas == repo.blob_shas
+
+    def test_tree_memo_eviction(self, tmp_path):
+        memo = TreeMemo(str(tmp_path / "tree_memo.sqlite"), max_trees=2)
+        for i in range(3):
+            memo.put(f"{i:040x}", b"tree %d" % i)
+        memo.flush()
+        # the oldest tree is evicted
+        assert memo.get(f"{0:040x}") is None
+        assert memo.get(f"{2:040x}") == b"tree 2"
+        memo.close()
+
+    def test_snapshot_shared_subtrees(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        # `a` and `b` are the same tree object
+        commit = commit_files(
+            repo.repo_path, {"a/x.py": "x\n", "b/x.py": "x\n"}, 1600003000
+        )
+        repo = Repository(REPO_URL, base_folder)
+        files = [name for _, name in repo.snapshot(commit)]
+        assert "a/x.py" in files and "b/x.py" in files
+        repo.close()
+
+    def test_traversal_summary(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder, max_edges=5, memory_budget=1)
+        summary = repo.traverse_all()
+        assert summary["num_commits"] == 3
+        assert sum(summary["chunk_commits"]) == 3
+        assert len(summary["chunk_commits"]) > 1
+        assert summary["peak_memory"] > 0
+        head = repo.repo.head.commit.hexsha
+        assert sorted(repo.index.commit_files(head)) == sorted(repo.snapshot(head))
+        repo.close()
+
+    def test_memory_budget(self, base_folder: str, monkeypatch):
+        path = Repository(REPO_URL, base_folder).repo_path
+        for i in range(60):
+            commit_files(path, {"pkg/core.py": f"x = {i}\n"}, 1600003000 + i)
+        repo = Repository(REPO_URL, base_folder, memory_budget=110)
+        # every new commit adds two trees to the cache, which holds the working set of a few trees
+        monkeypatch.setattr(
+            "pyradar.repository.memory_usage", lambda: 100 + len(repo.tree_cache)
+        )
+        summary = repo.traverse_all()
+        # the budget is checked every `MEMORY_CHECK_INTERVAL` commits and stays enforced
+        assert summary["peak_memory"] <= 110 + 2 * MEMORY_CHECK_INTERVAL + 5
+        assert len(summary["chunk_commits"]) > 3
+        assert repo.index.meta["num_commits"] == 63
+        repo.close()
+
+    def test_index_writer_commit(self, tmp_path):
+        folder = str(tmp_path / "index")
+        writer = RepoIndexWriter(folder)
+        blob_a, blob_b = calculate_sha("a"), calculate_sha("b")
+        writer.append_commit("1" * 40, 1600000000, [(blob_a, "a.py")])
+        writer.commit()
+        writer.append_commit(
+            "2" * 40, 1600001000, [(blob_a, "a.py"), (blob_b, "b.py")], "1" * 40
+        )
+        # only committed commits are visible to readers
+        index = RepoIndex(folder)
+        assert index.commit_ids == {"1" * 40: 0}
+        assert index.commit_files("1" * 40) == [(blob_a, "a.py")]
+        # the sorted arrays are only rebuilt on close
+        assert index.until == -1 and len(index.sorted_blobs) == 0
+        writer.close()
+        index = RepoIndex(folder)
+        assert sorted(index.commit_files("2" * 40)) == [
+            (blob_a, "a.py"),
+            (blob_b, "b.py"),
+        ]
+        assert index.blob_shas == sorted([blob_a, blob_b])
+
+    def test_index_writer_resume(self, tmp_path):
+        folder = str(tmp_path / "index")
+        blob_a, blob_b, blob_c = [calculate_sha(s) for s in "abc"]
+        writer = RepoIndexWriter(folder)
+        writer.append_commit("1" * 40, 1600000000, [(blob_a, "a.py")])
+        writer.close()
+        writer = RepoIndexWriter(folder)
+        writer.append_commit("2" * 40, 1600002000, [(blob_b, "b.py")])
+        writer.append_commit("3" * 40, 1600001000, [(blob_b, "b.py")])
+        # interrupted after a commit
+        writer.commit()
+        writer = RepoIndexWriter(folder)
+        writer.append_commit(
+            "4" * 40, 1600003000, [(blob_b, "b.py"), (blob_c, "c.py")], "3" * 40
+        )
+        writer.close()
+        index = RepoIndex(folder)
+        assert index.meta["num_blobs"] == 3 and index.meta["num_ts_log"] == 0
+        assert index.blob_history([blob_b, blob_c]) == [
+            ("3" * 40, 1600001000, ["b.py"]),
+            ("4" * 40, 1600003000, ["c.py"]),
+        ]
+
+    def test_parallel_traverse_all(self, base_folder: str):
+        path = Repository(REPO_URL, base_folder).repo_path
+        for i in range(6):
+            commit_files(path, {f"pkg/m{i}.py": f"x = {i}\n"}, 1600003000 + i)
+        repo = Repository(REPO_URL, base_folder, n_jobs=2, parallel_threshold=1)
+        summary = repo.traverse_all()
+        assert summary["num_commits"] == 9
+        assert not any(f.startswith("partial-") for f in os.listdir(repo.data_folder))
+        commits = repo.index.commits
+        # 5 ranges of 2 commits, each range starts at a checkpoint
+        assert commits["base"].tolist() == [-1, 0, -1, 2, -1, 4, -1, 6, -1]
+        for sha, _ in repo.commit_shas:
+            assert sorted(repo.index.commit_files(sha)) == sorted(repo.snapshot(sha))
+
+        blob_shas = sorted(bin_to_hex(repo.index.blobs))
+        history = repo.index.blob_history(blob_shas)
+        repo.close()
+
+        # the first appearances and paths of the merged blobs match a serial traversal
+        shutil.rmtree(repo.index_folder)
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        assert sorted(bin_to_hex(repo.index.blobs)) == blob_shas
+        assert repo.index.blob_history(blob_shas) == history
+        repo.close()
+
+    def test_window_traversal(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        summary = repo.traverse_all(until=1600001000)
+        assert summary["num_commits"] == 2
+        index = RepoIndex(repo.index_folder)
+        # up to the left out commit
+        assert index.until == 1600001999 and not index.covers(None)
+        # the submodule is only added by the last commit
+        assert calculate_sha("print('lib')\n") not in repo.window_blob_set(1600001000)
+        assert calculate_sha("x = 1\n") in repo.window_blob_set(1600001000)
+        assert calculate_sha("x = 1\n") not in repo.window_blob_set(1600000000)
+
+        # a wider window reuses the index and appends the remaining commits
+        assert calculate_sha("print('lib')\n") in repo.window_blob_set(1600002000)
+        assert repo.traversal_summary["num_commits"] == 1
+        assert repo.index.meta["num_commits"] == 3 and repo.index.until is None
+        repo.close()
+
+    def test_window_traversal_after_update(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        late = commit_files(repo.repo_path, {"pkg/late.py": "late\n"}, 1600005000)
+        early = commit_files(repo.repo_path, {"pkg/early.py": "early\n"}, 1600003000)
+        repo = Repository(REPO_URL, base_folder)
+        assert repo.traverse_all(until=1600004000)["num_commits"] == 1
+        index = RepoIndex(repo.index_folder)
+        # the newer commit is not indexed, so the index is no longer complete
+        assert early in index.commit_ids and late not in index.commit_ids
+        assert index.until == 1600004999 and not index.covers(None)
+        assert late in repo.index.commit_ids and repo.index.until is None
+        repo.close()
+
+    def test_tag_blob_set(self, base_folder: str):
+        repo = Repository(REPO_URL, base_folder)
+        first, second, _ = [sha for sha, _ in repo.commit_shas]
+        git(repo.repo_path, "tag", "v0.1.0", first)
+        git(repo.repo_path, "tag", "-a", "v0.2.0", "-m", "release 0.2.0", second)
+        git(repo.repo_path, "tag", "tree-tag", f"{first}^{{tree}}")
+        # a branch with the same name as a tag does not change the tag name
+        git(repo.repo_path, "branch", "v0.1.0", second)
+        repo = Repository(REPO_URL, base_folder)
+        assert repo.tag_commits == {"v0.1.0": first, "v0.2.0": second}
+
+        core = calculate_sha("x = 1\n")
+        assert core not in repo.tag_blob_set("v0.1.0")
+        assert core in repo.tag_blob_set("v0.2.0")
+        assert calculate_sha("setup()\n") in repo.tag_blob_set("v0.2.0")
+        assert repo.tag_blob_set("missing") is None
+        assert repo.tag_blob_set("tree-tag") is None
+        # the ancestors of the tagged commit are snapshotted as well
+        git(repo.repo_path, "rm", "-q", "pkg/core.py")
+        commit_files(repo.repo_path, {}, 1600003000)
+        git(repo.repo_path, "tag", "v0.3.0")
+        repo = Repository(REPO_URL, base_folder)
+        assert core not in repo.tag_blob_set("v0.3.0")
+        assert core in repo.tag_blob_set("v0.3.0", ancestors=1)
+        assert set(repo.tag_blob_sets()) == {"v0.1.0", "v0.2.0", "v0.3.0"}
+        # no commit is indexed
+        assert not os.path.exists(repo.index_folder)
+        # the tags are listed again after an update
+        git(repo.repo_path, "tag", "v0.4.0")
+        repo.update()
+        assert "v0.4.0" in repo.tag_commits
+        repo.close()
+
+    def test_locate_release(self, base_folder: str):
+        path = Repository(REPO_URL, base_folder).repo_path
+        releases = []
+        for i in range(3):
+            commit_files(path, {"pkg/core.py": f"x = {i + 10}\n"}, 1600003000 + i)
+            releases.append(git(path, "rev-parse", "HEAD"))
+        repo = Repository(REPO_URL, base_folder)
+        dist = [
+            ("pkg-0.1/setup.py", calculate_sha("setup()\n")),
+            ("pkg-0.1/pkg/core.py", calculate_sha("x = 11\n")),
+            ("pkg-0.1/PKG-INFO", calculate_sha("Name: pkg\n")),
+        ]
+        # small snapshots are sketched completely, so the estimates are exact
+        overlaps = repo.index.similar_commits([fsha for _, fsha in dist])
+        assert overlaps.round(6).tolist() == [1, 1, 1, 1, 2, 1]
+        counts = repo.index.contained_blobs([fsha for _, fsha in dist])
+        assert counts.tolist() == [1, 1, 1, 1, 2, 1]
+
+        located = repo.locate_release(dist, top=2)
+        assert located[0] == (releases[1], 2, [list(dist[2])])
+        assert located[1][1] == 1
+        assert repo.locate_release([]) == []
+        repo.close()
+
+    def test_locate_release_in_large_snapshot(self, base_folder: str):
+        path = Repository(REPO_URL, base_folder).repo_path
+        # a large snapshot with the whole distribution, then small snapshots with a part of it
+        files = {f"pkg/gen/m{i}.py": f"y = {i}\n" for i in range(300)}
+        large = commit_files(path, files, 1600003000)
+        git(path, "rm", "-q", "-r", "pkg/gen")
+        commit_files(path, {"pkg/gen/m0.py": "y = 0\n"}, 1600004000)
+        repo = Repository(REPO_URL, base_folder)
+        dist = [
+            (f"pkg-0.1/pkg/gen/m{i}.py", calculate_sha(f"y = {i}\n")) for i in range(3)
+        ]
+        fshas = [fsha for _, fsha in dist]
+        counts = repo.index.contained_blobs(fshas)
+        assert counts.tolist() == [0, 0, 0, 3, 1]
+        # the Jaccard estimate favors the small snapshot, diluted by the size of the large one
+        overlaps = repo.index.similar_commits(fshas)
+        assert overlaps[4] > overlaps[3]
+        assert repo.locate_release(dist) == [(large, 3, [])]
+        repo.close()
+
+    def test_blob_history(self, base_folder: str):
+        path = Repository(REPO_URL, base_folder).repo_path
+        # the same content moved to a new path later on
+        git(path, "mv", "setup.py", "build.py")
+        moved = commit_files(path, {}, 1600003000)
+        repo = Repository(REPO_URL, base_folder, max_edges=3)
+        first = repo.commit_shas[0][0]
+        history = repo.blob_history(
+            [calculate_sha("setup()\n"), calculate_sha("missing"), calculate_sha("")]
+        )
+        assert history[0] == (first, 1600000000, ["setup.py", "build.py"])
+        assert history[1] is None
+        assert history[2] == (first, 1600000000, ["pkg/__init__.py"])
+        assert repo.blob_history([calculate_sha("print('lib')\n")])[0][2] == [
+            "vendor/lib.py"
+        ]
+        assert moved in repo.index.commit_ids
+        repo.close()
+
+    def test_blobless_clone(self, base_folder: str):
+        upstream = Repository(REPO_URL, base_folder)
+        git(upstream.repo_path, "config", "uploadpack.allowFilter", "true")
+        upstream.traverse_all()
+        upstream.close()
+
+        url = f"file://{upstream.repo_path}"
+        repo = Repository(url, base_folder, blobless=True)
+        assert repo.repo_path != upstream.repo_path
+        assert git(repo.repo_path, "config", "remote.origin.promisor") == "true"
+        # no blob is fetched by cloning, listing blobs or traversing
+        assert repo.object_shas["blob"] == []
+        assert repo.object_blob_set.contains(upstream.blob_shas).all()
+        repo.traverse_all()
+        assert repo.blob_shas == upstream.blob_shas
+        # except the .gitmodules blobs, fetched in one request
+        assert repo.declared_submodules == {"vendor": SUBMODULE_URL}
+        assert list_objects(repo.repo)["blob"] == repo.gitmodules_blobs
+        # the variants would read every blob
+        assert repo.blob_variants is None
+        # other blobs are fetched lazily when read
+        assert repo.read_blob_content(calculate_sha("setup()\n")) == "setup()\n"
+        repo.close()
+
+    def test_blob_variants(self, base_folder: str):
+        path = Repository(REPO_URL, base_folder).repo_path
+        commit_files(path, {"pkg/win.py": "x = 1\r\ny = 2\r\n"}, 1600003000)
+        repo = Repository(REPO_URL, base_folder)
+        lf_blob_set, fingerprint_set = repo.blob_variants
+        assert list(lf_blob_set.contains([calculate_sha("x = 1\ny = 2\n")])) == [True]
+        assert len(lf_blob_set) == 1
+        assert len(fingerprint_set) == len(repo.blob_shas)
+        assert whitespace_fingerprint(b"x=1 y=2") in fingerprint_set
+        repo.close()
+
+        # only the blobs indexed since are read
+        commit_files(path, {"pkg/ws.py": "def f():\n    return 1\n"}, 1600004000)
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        lf_blob_set, fingerprint_set = repo.blob_variants
+        assert len(lf_blob_set) == 1
+        assert len(fingerprint_set) == len(repo.blob_shas)
+        assert whitespace_fingerprint(b"def f():\n\treturn 1  \n") in fingerprint_set
+        with open(os.path.join(repo.index_folder, "variants.json")) as f:
+            assert json.load(f) == {
+                "num_blobs": len(repo.blob_shas),
+                "generation": repo.index.generation,
+            }
+        repo.close()
+
+        # the variants of an index that was rebuilt are computed from scratch, even if the
+        # recorded number of blobs still fits
+        stale = os.path.join(base_folder, "variants")
+        shutil.copytree(repo.index_folder, stale)
+        shutil.rmtree(repo.index_folder)
+        repo = Repository(REPO_URL, base_folder)
+        repo.traverse_all()
+        for name in ["variants.json", "lf_blobs.bin", "ws_fingerprints.bin"]:
+            shutil.copy(os.path.join(stale, name), repo.index_folder)
+        # as if the variants of the earlier index were missing
+        open(os.path.join(repo.index_folder, "lf_blobs.bin"), "wb").close()
+        lf_blob_set, fingerprint_set = repo.blob_variants
+        assert len(lf_blob_set) == 1
+        assert len(fingerprint_set) == len(repo.blob_shas)
+        repo.close()